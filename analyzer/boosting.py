@@ -0,0 +1,92 @@
+import os
+import re
+from typing import List, Dict, Iterable, Sequence
+from .gitlog import Commit
+
+
+__all__ = [
+    'CatBoostCommitClassifier',
+    'commit_features',
+]
+
+
+# labels of class indices of the shipped cat_model, its metadata names
+# classes "0".."5" only. Verified by the words raising probability of each
+# class most: fix/fixed/error, doc/readme/changelog, add/initial/support,
+# refactor/remove/cleanup, test/tests/ci, bump/release/version
+CAT_LABELS = ("bug", "docs", "feature", "refactor", "test", "version")
+
+REGEX_PUNCT = re.compile(r"[^\w\s]")
+
+
+def commit_features(commit: Commit) -> Dict[str, float]:
+    """
+    bag of words of message (punctuation dropped: readme.md -> readmemd),
+    numstat sizes and touched file types. Only names known to the model
+    become columns
+    """
+    features = {}
+    for word in REGEX_PUNCT.sub("", commit.message).split():
+        features[word] = features.get(word, 0) + 1
+    features["#!INSERT"] = sum(stat.insert for stat in commit.stats)
+    features["#!DELETE"] = sum(stat.delete for stat in commit.stats)
+    features["#!FILES"] = len(commit.stats)
+    for stat in commit.stats:
+        ext = "#!EXT" + os.path.splitext(stat.filename)[1].lower()
+        features[ext] = features.get(ext, 0) + 1
+    return features
+
+
+class CatBoostCommitClassifier:
+    """
+    commit classifier backed by gradient boosting model (catboost),
+    scores a whole batch of commits with one predict call.
+    catboost, pandas and numpy are imported on load only
+    """
+
+    def __init__(self, model, labels: Sequence[str] = CAT_LABELS):
+        """
+        :param labels: labels of class indices, for models without class names
+        """
+        self.model = model
+        self.columns = {name: i for i, name in enumerate(model.feature_names_)}
+        # class names of model metadata, labels if trained on them
+        names = [str(c) for c in model.classes_]
+        self.labels = names if not all(name.isdigit() for name in names) else [labels[int(c)] for c in names]
+
+    @classmethod
+    def load(cls, fp: str) -> 'CatBoostCommitClassifier':
+        from catboost import CatBoostClassifier
+        model = CatBoostClassifier()
+        model.load_model(fp)
+        return cls(model)
+
+    def frame(self, commits: List[Commit]):
+        """
+        :return: DataFrame with a row per commit and model columns
+        """
+        import numpy as np
+        import pandas as pd
+        matrix = np.zeros((len(commits), len(self.columns)), dtype=np.float32)
+        columns = self.columns
+        for row, commit in enumerate(commits):
+            for name, value in commit_features(commit).items():
+                column = columns.get(name)
+                if column is not None:
+                    matrix[row, column] = value
+        return pd.DataFrame(matrix, columns=list(self.model.feature_names_))
+
+    def classify_commits(self, commits: List[Commit]) -> List[str]:
+        if not commits:
+            return []
+        probs = self.model.predict_proba(self.frame(commits))
+        return [self.labels[i] for i in probs.argmax(axis=1)]
+
+    def classify_many(self, messages: Iterable[str]) -> List[str]:
+        return self.classify_commits([
+            Commit("", "", (), None, None, message.lower(), [])
+            for message in messages
+        ])
+
+    def classify(self, message: str) -> str:
+        return self.classify_many([message])[0]
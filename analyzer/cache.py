@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from .utils import chunks
+
+
+__all__ = [
+    'FileCache',
+    'blob_sha',
+]
+
+
+# sqlite bound parameters per query
+QUERY_SIZE = 500
+READ_SIZE = 2 ** 20
+
+
+def blob_sha(path: str) -> str:
+    """
+    sha1 of file as `git hash-object` computes it
+    """
+    h = hashlib.sha1(b"blob %d\0" % os.path.getsize(path))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileCache:
+    """
+    analysis results of files in sqlite, by blob sha and file name (names
+    and extensions resolve languages too) and version of models and
+    extractors, so copies of a file in any module or repository share them.
+    Several processes can use one file: sqlite locks it, writes are one
+    transaction per flush and wait for each other up to timeout. Least
+    recently used rows are dropped above maxsize on close
+    """
+
+    def __init__(self, path: str, version: str, maxsize: int = 2 ** 18, timeout: float = 60.0):
+        self.path = path
+        self.version = version
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        # rows to write and keys to touch on flush
+        self._pending = {}
+        self._used = set()
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        # readers don't block the writer
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "key TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL, used REAL NOT NULL, "
+            "PRIMARY KEY (key, version))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_used ON files (used)")
+
+    def __enter__(self) -> 'FileCache':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def key(path: str) -> Optional[str]:
+        """
+        :return: key of file content and name, None if it can't be read
+        """
+        try:
+            return "{}:{}".format(blob_sha(path), os.path.basename(path))
+        except OSError:
+            return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple]:
+        """
+        :return: values of known keys, others are misses
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for batch in chunks(keys, QUERY_SIZE):
+            rows = self._db.execute(
+                "SELECT key, value FROM files WHERE version = ? AND key IN ({})".format(",".join("?" * len(batch))),
+                [self.version, *batch],
+            )
+            for key, value in rows:
+                found[key] = tuple(json.loads(value))
+        for key in keys:
+            if key in self._pending:
+                found[key] = self._pending[key]
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        self._used.update(found)
+        return found
+
+    def put(self, key: str, value: Tuple):
+        """
+        :param value: JSON serializable items
+        """
+        self._pending[key] = value
+
+    def flush(self):
+        if not self._pending and not self._used:
+            return
+        now = time.time()
+        with self._transaction():
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files (key, version, value, used) VALUES (?, ?, ?, ?)",
+                ((key, self.version, json.dumps(value), now) for key, value in self._pending.items()),
+            )
+            self._db.executemany(
+                "UPDATE files SET used = ? WHERE key = ? AND version = ?",
+                ((now, key, self.version) for key in self._used if key not in self._pending),
+            )
+        self.stored += len(self._pending)
+        self._pending.clear()
+        self._used.clear()
+
+    def evict(self):
+        with self._transaction():
+            size, = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+            if size > self.maxsize:
+                self._db.execute(
+                    "DELETE FROM files WHERE rowid IN (SELECT rowid FROM files ORDER BY used LIMIT ?)",
+                    (size - self.maxsize,),
+                )
+                self.evicted += size - self.maxsize
+
+    def close(self):
+        try:
+            self.flush()
+            self.evict()
+        finally:
+            self._db.close()
+
+    @contextmanager
+    def _transaction(self):
+        # write lock at once, no deadlock of two readers upgrading
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return total and self.hits / total
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "stored": self.stored,
+            "evicted": self.evicted,
+        }
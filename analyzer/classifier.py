@@ -1,24 +1,507 @@
 from __future__ import division
-from collections import defaultdict
-from math import log
-from typing import NewType, Dict, List, Tuple, Iterable
-from dataclasses import dataclass
+from collections import defaultdict, Counter
+from math import log, exp
+from array import array
+from collections.abc import Mapping
+from typing import NewType, NamedTuple, Dict, List, Tuple, Iterable, Sequence, Optional
+from dataclasses import dataclass, field
 from json import dumps, loads, load
+import hashlib
+import struct
+import mmap
+import sys
 import os
+from .utils import chunks
 
 
 __all__ = [
-    'train',
-    'classify'
+    'Classifier',
+    'Model',
+    'Counts',
+    'TokenEngine',
+    'convert',
+    'source_digest',
 ]
 
 
 LOG_MIN = 10 ** (-7)
 GUESSING_COEFICIENT = 1.5 # TODO: learn it
 UNKNOWN = "UNKNOWN"
+MARGIN = 200.0
+
+# magic, version, count of labels, count of rows, count of tokens, size of labels blob,
+# sha1 of JSON model it was converted from (zeros if none);
+# followed by priors (float64), costs (float64, rows x labels),
+# token offsets (uint32, tokens + 1), labels ("\0"-separated) and tokens blobs.
+# version 2 had no source digest, version 1 no count of rows either (rows == tokens)
+MODEL_HEADER = struct.Struct("<4sHHIII20s")
+MODEL_HEADER_V2 = struct.Struct("<4sHHIII")
+MODEL_HEADER_V1 = struct.Struct("<4sHHII")
+MODEL_MAGIC = b"KDM\0"
+MODEL_VERSION = 3
+NO_SOURCE = bytes(20)
 
 Sample = NewType("Sample", Tuple[Iterable, str])
 Samples = NewType("Samples", List[Sample])
+SparseMatrix = NewType("SparseMatrix", Tuple[List[int], List[int], List[int]])
+
+Prediction = NamedTuple("Prediction", (
+    ("label", str),
+    ("tokens", int),
+    ("decided", bool),
+))
+
+
+class Model:
+    """
+    compiled classifier: list of labels, token vocabulary and
+    token x class matrix of log-probabilities (flat, row-major).
+    costs are stored relative to the LOG_MIN penalty, so tokens missing
+    from the vocabulary add the same value to every class and can be skipped
+    """
+
+    __slots__ = ("labels", "vocab", "priors", "costs", "buffer", "lookups")
+
+    def __init__(self, labels: Sequence[str], vocab: Dict[str, int],
+                 priors: Sequence[float], costs: Sequence[float], buffer=None):
+        self.labels = tuple(labels)
+        self.vocab = vocab
+        self.priors = list(priors)
+        self.costs = costs
+        # keeps mmap (or other memory) behind costs alive
+        self.buffer = buffer
+        # encoding -> vocabulary of encoded tokens
+        self.lookups = {}
+
+    @classmethod
+    def compile(cls, classes: Dict[str, float], freq: Dict[Tuple[str, str], float]) -> 'Model':
+        labels = list(classes.keys())
+        index = {label: i for i, label in enumerate(labels)}
+        width = len(labels)
+        vocab, costs = {}, array("d")
+        penalty = -log(LOG_MIN)
+        for (label, token), value in freq.items():
+            if label not in index:
+                continue
+            t = vocab.get(token)
+            if t is None:
+                t = vocab[token] = len(vocab)
+                costs.extend([0.0] * width)
+            costs[t * width + index[label]] = -log(value) - penalty
+        priors = [-log(classes[label]) for label in labels]
+        return cls(labels, vocab, priors, costs)
+
+    @property
+    def classes(self) -> Dict[str, float]:
+        return {label: exp(-prior) for label, prior in zip(self.labels, self.priors)}
+
+    @property
+    def freq(self) -> 'ModelFreq':
+        return ModelFreq(self)
+
+    def tobytes(self, source: bytes = NO_SOURCE) -> bytes:
+        """
+        serialize model to binary format, see MODEL_HEADER
+        :param source: sha1 digest of JSON model it is converted from
+        """
+        labels = "\0".join(self.labels).encode()
+        tokens = [token.encode() for token in sorted(self.vocab, key=self.vocab.get)]
+        rows = len(self.costs) // len(self.labels) if self.labels else 0
+        offsets = array("I", [0])
+        for token in tokens:
+            offsets.append(offsets[-1] + len(token))
+        priors, costs, offsets = array("d", self.priors), array("d", self.costs), offsets
+        if sys.byteorder != "little":
+            for a in (priors, costs, offsets):
+                a.byteswap()
+        header = MODEL_HEADER.pack(
+            MODEL_MAGIC, MODEL_VERSION, len(self.labels), rows, len(tokens), len(labels), source)
+        return b"".join((
+            header, priors.tobytes(), costs.tobytes(), offsets.tobytes(), labels, b"".join(tokens)))
+
+    @classmethod
+    def frombuffer(cls, buffer) -> 'Model':
+        """
+        load model from binary format without copying the costs matrix
+        :param buffer: bytes, mmap, shared memory, ...
+        :return: Model
+        """
+        view = memoryview(buffer)
+        magic, version = MODEL_HEADER_V1.unpack_from(view)[:2]
+        if magic != MODEL_MAGIC:
+            raise ValueError("invalid model format")
+        if version > MODEL_VERSION:
+            raise ValueError("unsupported model version {} (expected <= {})".format(version, MODEL_VERSION))
+        if version == 1:
+            _, _, width, size, labels_size = MODEL_HEADER_V1.unpack_from(view)
+            rows, pos = size, MODEL_HEADER_V1.size
+        elif version == 2:
+            _, _, width, rows, size, labels_size = MODEL_HEADER_V2.unpack_from(view)
+            pos = MODEL_HEADER_V2.size
+        else:
+            _, _, width, rows, size, labels_size, _ = MODEL_HEADER.unpack_from(view)
+            pos = MODEL_HEADER.size
+        priors = _cast(view[pos:pos + width * 8], "d")
+        pos += width * 8
+        costs = _cast(view[pos:pos + width * rows * 8], "d")
+        pos += width * rows * 8
+        offsets = _cast(view[pos:pos + (size + 1) * 4], "I")
+        pos += (size + 1) * 4
+        labels = bytes(view[pos:pos + labels_size]).decode()
+        pos += labels_size
+        tokens = bytes(view[pos:pos + offsets[-1]])
+        vocab = {
+            tokens[offsets[i]:offsets[i + 1]].decode(): i
+            for i in range(size)
+        }
+        return cls(labels.split("\0") if width else [], vocab, priors, costs, buffer)
+
+    def close(self):
+        """
+        release memory behind costs (mmap, shared memory), model can't be used after
+        """
+        if isinstance(self.costs, memoryview):
+            self.costs.release()
+        if self.buffer is not None and hasattr(self.buffer, "close"):
+            self.buffer.close()
+        self.buffer = None
+
+    @classmethod
+    def open(cls, fp: str) -> 'Model':
+        """
+        memory-map binary model file
+        """
+        with open(fp, "rb") as f:
+            return cls.frombuffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def ids(self, tokens: Iterable[str]) -> Iterable[Optional[int]]:
+        """
+        :return: row of each token, None for unknown tokens
+        """
+        return map(self.vocab.get, tokens)
+
+    def index(self, token: str) -> Optional[int]:
+        return self.vocab.get(token)
+
+    def lookup(self, encoding: Optional[str] = None) -> Dict:
+        """
+        vocabulary to map tokens to rows while tokenizing (see Scanner.scan)
+        :param encoding: tokens are bytes in this encoding
+        :return: token -> row
+        """
+        if encoding is None:
+            return self.vocab
+        lookup = self.lookups.get(encoding)
+        if lookup is None:
+            lookup = self.lookups[encoding] = {token.encode(encoding): t for token, t in self.vocab.items()}
+        return lookup
+
+    def tokens(self) -> Iterable[Tuple[str, int]]:
+        """
+        :return: pairs of token and row
+        """
+        return self.vocab.items()
+
+    def vectorize(self, documents: Iterable[Iterable[str]]) -> SparseMatrix:
+        """
+        build sparse (CSR) document x token count matrix
+        :param documents: token streams
+        :return: indptr, indices, counts
+        """
+        return self.vectorize_ids(map(self.ids, documents))
+
+    def vectorize_ids(self, documents: Iterable[Iterable[Optional[int]]]) -> SparseMatrix:
+        """
+        :param documents: streams of rows, None for unknown tokens
+        """
+        indptr, indices, counts = [0], [], []
+        for ids in documents:
+            row = Counter(ids)
+            row.pop(None, None)
+            indices.extend(row.keys())
+            counts.extend(row.values())
+            indptr.append(len(indices))
+        return indptr, indices, counts
+
+    def priors_for(self, guess: Optional[str] = None) -> List[float]:
+        """
+        :param guess: hinted class, GUESSING_COEFICIENT times more likely
+        :return: class costs before any token
+        """
+        if not guess or guess not in self.labels:
+            return self.priors
+        priors = list(self.priors)
+        priors[self.labels.index(guess)] -= log(GUESSING_COEFICIENT)
+        return priors
+
+    def scores(self, matrix: SparseMatrix, guesses: Optional[Sequence[Optional[str]]] = None) -> List[List[float]]:
+        """
+        multiply count matrix by log-probabilities matrix, with numpy if
+        it's installed (it comes with pandas)
+        :param matrix: sparse document x token matrix
+        :param guesses: hinted class of each document, see priors_for
+        :return: document x class costs (lower is better)
+        """
+        indptr = matrix[0]
+        priors = [self.priors_for(guesses[i] if guesses else None) for i in range(len(indptr) - 1)]
+        try:
+            import numpy
+        except ImportError:
+            return self._scores(matrix, priors)
+        indptr, indices, counts = (numpy.asarray(a, dtype=numpy.int64) for a in matrix)
+        result = numpy.array(priors, dtype=numpy.float64).reshape(len(priors), len(self.labels))
+        if len(indices):
+            costs = numpy.frombuffer(self.costs, dtype=numpy.float64).reshape(-1, len(self.labels))
+            rows = costs[indices] * counts[:, None]
+            # reduceat sums from indptr[i] to indptr[i + 1], empty rows have nothing to sum
+            filled = indptr[1:] > indptr[:-1]
+            result[filled] += numpy.add.reduceat(rows, indptr[:-1][filled], axis=0)
+        return result.tolist()
+
+    def _scores(self, matrix: SparseMatrix, priors: List[List[float]]) -> List[List[float]]:
+        indptr, indices, counts = matrix
+        costs, width = self.costs, len(self.labels)
+        result = []
+        for i, r in enumerate(priors):
+            r = list(r)
+            for j in range(indptr[i], indptr[i + 1]):
+                n, t = counts[j], indices[j] * width
+                for c in range(width):
+                    r[c] += n * costs[t + c]
+            result.append(r)
+        return result
+
+    def stream(self, tokens: Iterable[str], margin: float = MARGIN) -> Prediction:
+        """
+        consume tokens lazily until the gap between the best and the
+        second-best class exceeds margin
+        :param tokens: token generator
+        :param margin: log-probability gap to stop at
+        :return: prediction, count of consumed tokens and early exit flag
+        """
+        return self.stream_ids(self.ids(tokens), margin)
+
+    def stream_ids(self, ids: Iterable[Optional[int]], margin: float = MARGIN,
+                   guess: Optional[str] = None) -> Prediction:
+        """
+        :param ids: stream of rows, None for unknown tokens
+        :param guess: hinted class, see priors_for
+        """
+        if len(self.labels) < 2:
+            return Prediction(self.labels[0] if self.labels else UNKNOWN, 0, True)
+        costs, width = self.costs, len(self.labels)
+        r = self.priors_for(guess)
+        consumed = 0
+        decided = False
+        for t in ids:
+            consumed += 1
+            if t is None:
+                continue
+            t *= width
+            r = [a + b for a, b in zip(r, costs[t:t + width])]
+            best, second = sorted(r)[:2]
+            if second - best > margin:
+                decided = True
+                break
+        return Prediction(self.labels[min(range(width), key=r.__getitem__)], consumed, decided)
+
+    def predict(self, documents: Iterable[Iterable[str]]) -> List[str]:
+        return self.predict_ids(map(self.ids, documents))
+
+    def predict_ids(self, documents: Iterable[Iterable[Optional[int]]],
+                    guesses: Optional[Sequence[Optional[str]]] = None) -> List[str]:
+        if not self.labels:
+            return [UNKNOWN for _ in documents]
+        return [
+            self.labels[min(range(len(r)), key=r.__getitem__)]
+            for r in self.scores(self.vectorize_ids(documents), guesses)
+        ]
+
+
+class TokenEngine:
+    """
+    features are tokens of Classifier.extract, scored through the vocabulary
+    """
+
+    model = Model
+
+    def features(self, tokens: Iterable[str]) -> Iterable:
+        return tokens
+
+    def lookup(self, model: Model, encoding: Optional[str] = None) -> Optional[Dict]:
+        """
+        vocabulary for tokenizers emitting rows instead of tokens,
+        None when features aren't the tokens themselves
+        """
+        return model.lookup(encoding)
+
+    def compile(self, classes: Dict[str, float], freq: Dict[Tuple, float]) -> Model:
+        return self.model.compile(classes, freq)
+
+    def frombuffer(self, buffer) -> Model:
+        return self._check(self.model.frombuffer(buffer))
+
+    def open(self, fp: str) -> Model:
+        return self._check(self.model.open(fp))
+
+    def _check(self, model: Model) -> Model:
+        if len(model.vocab) * len(model.labels) != len(model.costs):
+            raise ValueError("model has no vocabulary for its rows, not a token model")
+        return model
+
+
+class ModelFreq(Mapping):
+    """
+    read-only view of compiled model as `freq` dict of Classifier
+    """
+
+    def __init__(self, model: Model):
+        self.model = model
+
+    def __getitem__(self, key: Tuple[str, str]) -> float:
+        label, token = key
+        model, t = self.model, self.model.index(token)
+        if t is None or label not in model.labels:
+            raise KeyError(key)
+        cost = model.costs[t * len(model.labels) + model.labels.index(label)]
+        if not cost:
+            raise KeyError(key)
+        return exp(-cost) * LOG_MIN
+
+    def __iter__(self):
+        width = len(self.model.labels)
+        for token, t in self.model.tokens():
+            for i, label in enumerate(self.model.labels):
+                if self.model.costs[t * width + i]:
+                    yield label, token
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def _entropy(counts: Iterable[float], total: float) -> float:
+    if total <= 0:
+        return 0.0
+    return -sum(n / total * log(n / total) for n in counts if n > 0)
+
+
+def _cast(view: memoryview, fmt: str):
+    if sys.byteorder == "little":
+        return view.cast(fmt)
+    a = array(fmt, bytes(view))
+    a.byteswap()
+    return a
+
+
+@dataclass
+class Counts:
+    """
+    raw training statistics: documents per class and occurrences per
+    (class, token). Counts of disjoint training sets can be merged
+    """
+
+    docs: Dict[str, int] = field(default_factory=dict)
+    tokens: Dict[Tuple[str, str], int] = field(default_factory=dict)
+
+    def add(self, feats: Iterable[str], label: str) -> 'Counts':
+        self.docs[label] = self.docs.get(label, 0) + 1
+        tokens = self.tokens
+        for feat in feats:
+            key = label, feat
+            tokens[key] = tokens.get(key, 0) + 1
+        return self
+
+    def merge(self, other: 'Counts') -> 'Counts':
+        for label, n in other.docs.items():
+            self.docs[label] = self.docs.get(label, 0) + n
+        tokens = self.tokens
+        for key, n in other.tokens.items():
+            tokens[key] = tokens.get(key, 0) + n
+        return self
+
+    @classmethod
+    def from_frequencies(cls, classes: Dict[str, float], freq: Dict[Tuple[str, str], float],
+                         max_docs: int = 10 ** 6, tolerance: float = 1e-9) -> 'Counts':
+        """
+        recover counts of normalized model: class probabilities are
+        docs / total and frequencies are occurrences / docs of class. Total
+        is the smallest one whose rounded counts reproduce every probability
+        and frequency within tolerance, max_docs if none does
+        :param max_docs: upper bound of documents in training set
+        :param tolerance: relative error of reproduced values
+        """
+        def integral(value: float) -> bool:
+            return abs(value - round(value)) <= tolerance * value
+
+        labels = [label for label, p in classes.items() if p > 0]
+        rarest = min((classes[label] for label in labels), default=1.0)
+        total = max_docs
+        # documents of the rarest class, every n gives one or two candidates
+        for n in range(1, int(rarest * max_docs) + 1):
+            candidates = sorted({int(n / rarest), int(n / rarest) + 1})
+            found = next((
+                t for t in candidates
+                if t <= max_docs
+                and all(integral(classes[label] * t) for label in labels)
+                and all(integral(value * round(classes[label] * t))
+                        for (label, _), value in freq.items() if label in classes)
+            ), None)
+            if found is not None:
+                total = found
+                break
+        docs = {label: max(1, int(round(p * total))) for label, p in classes.items()}
+        tokens = {
+            (label, token): int(round(value * docs[label]))
+            for (label, token), value in freq.items()
+            if label in docs
+        }
+        return cls(docs, tokens)
+
+    def information_gain(self) -> Dict[str, float]:
+        """
+        information gain of each token about the class, over token occurrences:
+        IG(t) = H(C) - P(t) * H(C|t) - P(~t) * H(C|~t)
+        """
+        per_class, per_token = defaultdict(lambda: 0), defaultdict(dict)
+        for (label, token), n in self.tokens.items():
+            per_class[label] += n
+            per_token[token][label] = n
+        total = sum(per_class.values())
+        if not total:
+            return {}
+        base = _entropy(per_class.values(), total)
+        result = {}
+        for token, labels in per_token.items():
+            n = sum(labels.values())
+            rest = [per_class[label] - labels.get(label, 0) for label in per_class]
+            result[token] = base \
+                - n / total * _entropy(labels.values(), n) \
+                - (total - n) / total * _entropy(rest, total - n)
+        return result
+
+    def prune(self, k: int) -> 'Counts':
+        """
+        keep k most informative tokens
+        """
+        gain = self.information_gain()
+        keep = set(sorted(gain, key=lambda token: (-gain[token], token))[:k])
+        return Counts(dict(self.docs), {
+            (label, token): n
+            for (label, token), n in self.tokens.items()
+            if token in keep
+        })
+
+    def frequencies(self) -> Tuple[Dict[str, float], Dict[Tuple[str, str], float]]:
+        """
+        :return: class probabilities and mean token occurrences per document of class
+        """
+        total = sum(self.docs.values())
+        classes = {label: n / total for label, n in self.docs.items()}
+        freq = {
+            (label, token): n / self.docs[label]
+            for (label, token), n in self.tokens.items()
+        }
+        return classes, freq
 
 
 @dataclass(frozen=True)
@@ -26,6 +509,10 @@ class Classifier:
 
     classes: Dict[str, int]
     freq: Dict[str, int]
+    counts: Optional[Counts] = None
+
+    # how features are built from tokens and scored, see engines
+    ENGINE = TokenEngine()
 
     @classmethod
     def train(cls, samples) -> 'Classifier':
@@ -33,39 +520,83 @@ class Classifier:
         :param samples: train set for create classifier
         :return: Classifier
         """
-        classes, freq = defaultdict(lambda: 0), defaultdict(lambda: 0)
-        counter = 0
+        counts = Counts()
+        for feats, label in samples:
+            counts.add(cls.features(feats), label)
+        return cls.from_counts(counts)
+
+    @classmethod
+    def from_counts(cls, counts: Counts) -> 'Classifier':
+        classes, freq = counts.frequencies()
+        return cls(classes, freq, counts)
+
+    def update(self, samples) -> 'Classifier':
+        """
+        fold newly labeled documents into the model without old train set.
+        counts of normalized models are recovered with Counts.from_frequencies
+        :param samples: pairs of document and class
+        :return: updated classifier
+        """
+        counts = Counts().merge(self.counts or Counts.from_frequencies(self.classes, self.freq))
         for feats, label in samples:
-            classes[label] += 1
-            counter +=1
-            for feat in cls.extract(feats):
-                freq[label, feat] += 1
+            counts.add(self.features(feats), label)
+        return self.from_counts(counts)
 
-        for label, feat in freq:
-            freq[label, feat] /= classes[label]
-        for c in classes:
-            classes[c] /= counter
-        return cls(classes, freq)
+    def prune(self, k: int) -> 'Classifier':
+        """
+        keep k tokens with the highest information gain
+        """
+        counts = self.counts or Counts.from_frequencies(self.classes, self.freq)
+        return self.from_counts(counts.prune(k))
 
+    def merge(self, other: 'Classifier') -> 'Classifier':
+        """
+        combine two count-based classifiers
+        """
+        if self.counts is None or other.counts is None:
+            raise ValueError("only count-based classifiers can be merged")
+        return self.from_counts(Counts().merge(self.counts).merge(other.counts))
+
+    @property
+    def model(self) -> Model:
+        """
+        compiled model, built once per classifier
+        """
+        model = self.__dict__.get("_model")
+        if model is None:
+            model = self.ENGINE.compile(self.classes, self.freq)
+            object.__setattr__(self, "_model", model)
+        return model
 
     def classify(self, s: str, guess_class: str = "") ->  str:
-        results = []
-        feats =  [token for token in self.extract(s)]
-        for cls in self.classes.keys():
-            r = -log(self.classes[cls]) + \
-                sum(-log(self.freq.get((cls,feat), LOG_MIN)) for feat in feats)  # TODO: add guess coef
-            results.append((cls, r))
-        if not results:
-            return UNKNOWN
-        return sorted(results, key=lambda cls: cls[1])[0][0]
+        return self.classify_many([s], [guess_class])[0]
 
-    @classmethod
-    def build_samples(cls, samples_dir: str, class_name: str = ""):
+    def classify_stream(self, s: str, guess_class: str = "", margin: float = MARGIN) -> Prediction:
         """
-        recursive scan dir with samples to build a training set
+        classify document reading tokens only while the result is ambiguous
+        :param s: document
+        :param guess_class: hint for document
+        :param margin: see Model.stream
+        :return: Prediction
+        """
+        return self.model.stream_ids(self.ids(s), margin, guess_class)
+
+    def classify_many(self, documents: Sequence[str], guess_classes: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        classify batch of documents with one sparse matrix product
+        :param documents: list of documents
+        :param guess_classes: hinted classes of documents, GUESSING_COEFICIENT
+                              times more likely
+        :return: list of classes
+        """
+        return self.model.predict_ids((self.ids(s) for s in documents), guess_classes)
+
+    @staticmethod
+    def sample_files(samples_dir: str):
+        """
+        recursive scan dir with samples
         :param samples_dir: direcrory with samples
-        :param cls: class name
-        :return: train set
+        :return: pairs of file and class name (name of parent dir)
         """
         queue = [os.path.join(samples_dir, file) for file in os.listdir(samples_dir)]
         while len(queue) > 0:
@@ -76,37 +607,110 @@ class Classifier:
                     for file in os.listdir(fp)
                 )
                 continue
+            yield fp, os.path.basename(os.path.dirname(fp))
+
+    @classmethod
+    def build_samples(cls, samples_dir: str, class_name: str = ""):
+        """
+        recursive scan dir with samples to build a training set
+        :param samples_dir: direcrory with samples
+        :param cls: class name
+        :return: train set
+        """
+        for fp, label in cls.sample_files(samples_dir):
             with open(fp, "r") as f:
-                yield (f.read(), os.path.basename(os.path.dirname(fp)))
+                yield (f.read(), label)
 
     @classmethod
-    def from_samples(cls, samples_dir: str) -> 'Classifier':
-        return cls.train(cls.build_samples(samples_dir))
+    def count_files(cls, files: List[Tuple[str, str]]) -> Counts:
+        """
+        map step of training: tokenize sample files
+        :param files: pairs of file and class name
+        :return: partial counts
+        """
+        counts = Counts()
+        for fp, label in files:
+            with open(fp, "r") as f:
+                counts.add(cls.features(f.read()), label)
+        return counts
+
+    @classmethod
+    def from_samples(cls, samples_dir: str, jobs: int = 1) -> 'Classifier':
+        """
+        train classifier on samples dir, tokenize files in `jobs` processes
+        and reduce partial counts
+        """
+        if jobs <= 1:
+            return cls.train(cls.build_samples(samples_dir))
+        from .shared import pool_context
+        files = list(cls.sample_files(samples_dir))
+        # small chunks: sample files differ in size a lot
+        size = max(1, len(files) // (jobs * 4))
+        counts = Counts()
+        with pool_context().Pool(jobs) as pool:
+            for partial in pool.imap(cls.count_files, chunks(files, size)):
+                counts.merge(partial)
+        return cls.from_counts(counts)
 
     @staticmethod
     def extract(s: str):
         raise NotImplementedError
 
     @classmethod
-    def loads(cls, s: str):
-        kwargs = loads(s)
+    def features(cls, s: str) -> Iterable:
+        return cls.ENGINE.features(cls.extract(s))
+
+    def ids(self, s: str) -> Iterable[Optional[int]]:
+        """
+        model rows of features of document, None for unknown ones
+        """
+        return self.model.ids(self.features(s))
+
+    @classmethod
+    def from_dict(cls, kwargs: dict) -> 'Classifier':
+        """
+        :param kwargs: count-based ("docs", "counts") or normalized ("classes", "freq") model
+        """
+        if "counts" in kwargs:
+            return cls.from_counts(Counts(kwargs["docs"], {
+                (item.get("class"), item.get("token")): item.get("value")
+                for item in kwargs["counts"]
+            }))
         freq = {
             (item.get("class"), item.get("token")): item.get("value")
             for item in kwargs.pop("freq")
         }
         return cls(**kwargs, freq=freq)
 
+    @classmethod
+    def loads(cls, s: str):
+        return cls.from_dict(loads(s))
+
+    @classmethod
+    def from_model(cls, model: Model) -> 'Classifier':
+        classifier = cls(model.classes, model.freq)
+        object.__setattr__(classifier, "_model", model)
+        return classifier
+
     @classmethod
     def load(cls, db: str):
+        with open(db, "rb") as f:
+            binary = f.read(len(MODEL_MAGIC)) == MODEL_MAGIC
+        if binary:
+            return cls.from_model(cls.ENGINE.open(db))
         with open(db, "r") as f:
-            kwargs = load(f)
-        freq = {
-            (item.get("class"), item.get("token")): item.get("value")
-            for item in kwargs.pop("freq")
-        }
-        return cls(**kwargs, freq=freq)
+            return cls.from_dict(load(f))
 
     def dumps(self, **kwargs):
+        if self.counts is not None:
+            return dumps({
+                "docs": self.counts.docs,
+                "counts": [{
+                    "class": cls,
+                    "token": token,
+                    "value": value
+                } for (cls, token), value in self.counts.tokens.items()],
+            }, **kwargs)
         return dumps({
             "classes": self.classes,
             "freq": [{
@@ -115,3 +719,36 @@ class Classifier:
                 "value": value
             } for (cls, token), value  in self.freq.items()],
         }, **kwargs)
+
+    def dumpb(self, source: bytes = NO_SOURCE) -> bytes:
+        return self.model.tobytes(source)
+
+
+def convert(src: str, dst: str, classifier_cls=Classifier):
+    """
+    convert JSON model produced by Classifier.dumps to binary format,
+    digest of src is kept to tell if the binary model is stale
+    :param src: JSON model
+    :param dst: destination file
+    :param classifier_cls: classifier the model was trained for, its
+                           engine compiles features (e.g. NGramPolyglot)
+    """
+    with open(src, "rb") as f:
+        source = hashlib.sha1(f.read()).digest()
+    with open(dst, "wb") as f:
+        f.write(classifier_cls.load(src).dumpb(source))
+
+
+def source_digest(fp: str) -> Optional[str]:
+    """
+    :param fp: binary model
+    :return: hex sha1 of JSON model it was converted from, None if unknown
+    """
+    with open(fp, "rb") as f:
+        header = f.read(MODEL_HEADER.size)
+    if len(header) < MODEL_HEADER.size or header[:len(MODEL_MAGIC)] != MODEL_MAGIC:
+        return None
+    magic, version, _, _, _, _, source = MODEL_HEADER.unpack(header)
+    if version < 3 or source == NO_SOURCE:
+        return None
+    return source.hex()
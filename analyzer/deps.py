@@ -1,15 +1,24 @@
 from .utils import exec
-from json import loads
+from collections import defaultdict
+from dataclasses import dataclass, field
+from json import JSONDecoder
+import json
 import ast
-import esprima
-from typing import Set
+import re
+import unicodedata
+from typing import Dict, List, Set, Optional
 import os
 
 
 __all__ = [
     'get_python_deps',
+    'scan_python_imports',
     'get_js_deps',
+    'scan_js_imports',
     'get_go_deps',
+    'scan_go_imports',
+    'go_list_imports',
+    'ModuleIndex',
 ]
 
 
@@ -38,38 +47,380 @@ class AstParseVisitor(ast.NodeVisitor):
         return visitor.imports
 
 
-def get_python_deps(s: str) -> Set[str]:
-    visitor = AstParseVisitor()
-    visitor.visit(ast.parse(s))
-    return visitor.imports
+# whitespace within a logical line, and within brackets
+_WS = r"(?:[ \t\f]|\\\n)"
+_BWS = r"(?:\s|\\\n|\#[^\n]*)"
+_NAME = r"[^\W\d]\w*"
+_DOTTED = r"{name}(?:{ws}*\.{ws}*{name})*".format(name=_NAME, ws=_WS)
 
 
-def get_js_deps(s: str) -> Set[str]:
-    script = esprima.parseModule(s, { "jsx": True })
-    r = set()
-    for token in script.body:
-        if token.type == 'ImportDeclaration':
-            if str(token.source.value).startswith("."):
-                continue
-            r.add(token.source.value.split('/')[0])
+def _aliases(name: str, ws: str) -> str:
+    alias = r"{name}(?:{ws}+as{ws}+{short})?".format(name=name, ws=ws, short=_NAME)
+    return r"{alias}(?:{ws}*,{ws}*{alias})*".format(alias=alias, ws=ws)
+
+
+# strings and comments are skipped, import statements start with keywords
+REGEX_PYTHON_SCAN = re.compile(r"(?P<quote>'''|\"\"\"|'|\")|\#[^\n]*|\b(?P<keyword>import|from)\b")
+REGEX_PYTHON_STRING_END = {
+    quote: re.compile(r"(?<!\\)(?:\\\\)*(?:{}{})".format(re.escape(quote), "" if len(quote) == 3 else r"|\n"))
+    for quote in ("'''", '"""', "'", '"')
+}
+REGEX_PYTHON_IMPORT = re.compile(r"import{ws}+(?P<names>{names})".format(ws=_WS, names=_aliases(_DOTTED, _WS)))
+REGEX_PYTHON_FROM = re.compile(
+    r"from{ws}*(?P<dots>(?:\.{ws}*)*)(?:(?P<module>{dotted}){ws}+|{ws}*)import\b{ws}*"
+    r"(?P<names>\*|\({bws}*{bracketed}{bws}*,?{bws}*\)|{names})".format(
+        ws=_WS, bws=_BWS, dotted=_DOTTED, names=_aliases(_NAME, _WS), bracketed=_aliases(_NAME, _BWS)))
+REGEX_PYTHON_STATEMENT_END = re.compile(r"{ws}*(?:[;#\n]|\Z)".format(ws=_WS))
+REGEX_PYTHON_FIRST_NAMES = re.compile(r"(?:^|[(,])(?:\s|\\\n)*({name}|\*)".format(name=_NAME))
+REGEX_PYTHON_COMMENT = re.compile(r"\#[^\n]*")
+
+
+def _statement_start(s: str, pos: int) -> bool:
+    while pos and s[pos - 1] in " \t\f":
+        pos -= 1
+    return pos == 0 or s[pos - 1] in "\n;:"
+
+
+def _first_names(names: str) -> Set[str]:
+    """
+    top-level names of `a.b as c, d` or `(a, b)`
+    """
+    names = REGEX_PYTHON_COMMENT.sub("", names)
+    return {
+        # python normalizes identifiers (NFKC) when parsing
+        name if name.isascii() else unicodedata.normalize("NFKC", name)
+        for name in REGEX_PYTHON_FIRST_NAMES.findall(names)
+    }
+
+
+def scan_python_imports(s: str) -> Optional[Set[str]]:
+    """
+    same names as AstParseVisitor without parsing: skips strings and
+    comments and matches only import statements
+    :return: top-level module names, None if an import statement isn't
+             understood (AST should decide)
+    """
+    if "\r" in s:
+        s = s.replace("\r\n", "\n").replace("\r", "\n")
+    imports, pos = set(), 0
+    while True:
+        m = REGEX_PYTHON_SCAN.search(s, pos)
+        if m is None:
+            return imports
+        quote = m.group("quote")
+        if quote is not None:
+            end = REGEX_PYTHON_STRING_END[quote].search(s, m.end())
+            # unterminated string lasts to the end of line or file
+            pos = len(s) if end is None else end.end()
+            continue
+        keyword = m.group("keyword")
+        if keyword is None:
+            pos = m.end()
             continue
-        if token.type == 'CallExpression':
-            if token.callee.name != "require":
+        if not _statement_start(s, m.start()):
+            if keyword == "from":
+                # yield from, raise ... from
+                pos = m.end()
                 continue
-            if str(token.arguments[0].value).startswith("."):
+            return None
+        statement = (REGEX_PYTHON_IMPORT if keyword == "import" else REGEX_PYTHON_FROM).match(s, m.start())
+        if statement is None or not REGEX_PYTHON_STATEMENT_END.match(s, statement.end()):
+            return None
+        if keyword == "from" and statement.group("module"):
+            imports |= _first_names(statement.group("module"))
+        elif keyword == "from" and not statement.group("dots"):
+            return None
+        else:
+            imports |= _first_names(statement.group("names"))
+        pos = statement.end()
+
+
+def get_python_deps(s: str) -> Set[str]:
+    """
+    import scanner, AST when the scanner isn't sure
+    """
+    imports = scan_python_imports(s)
+    if imports is None:
+        imports = AstParseVisitor.get_imports(s)
+    return imports
+
+
+_JS_STRING = r"""'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|`[^`\\$]*`"""
+
+# strings, comments, templates and regex literals are skipped; braces
+# matter only inside ${} of templates
+REGEX_JS_SCAN = re.compile(r"""(?P<quote>['"`])|(?P<comment>//|/\*)|(?P<slash>/)|(?<![\w$.])(?P<keyword>import|export|require)\b""")
+REGEX_JS_TEMPLATE_SCAN = re.compile(REGEX_JS_SCAN.pattern + r"|(?P<brace>[{}])")
+REGEX_JS_STRING_END = {
+    quote: re.compile(r"(?<!\\)(?:\\\\)*(?:{}|\n)".format(quote))
+    for quote in ("'", '"')
+}
+REGEX_JS_TEMPLATE = re.compile(r"(?:[^`\\$]|\\.|\$(?!\{))*(?:`|(?P<open>\$\{)|\Z)", re.DOTALL)
+REGEX_JS_REGEX = re.compile(r"/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[\w$]*")
+REGEX_JS_TRAILING_WORD = re.compile(r"[\w$]+\Z")
+# a regex literal, not division, may follow these words
+JS_REGEX_KEYWORDS = frozenset((
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else",
+    "yield", "await",
+))
+REGEX_JS_STATEMENT = {
+    "import": re.compile(
+        r"import\s*(?:(?P<source>{string})|\(\s*(?P<dynamic>{string})\s*[,)]"
+        r"|(?:\s|(?=[{{*]))[^;'\"`()]*?\bfrom\s*(?P<from>{string}))".format(string=_JS_STRING)),
+    "export": re.compile(
+        r"export\s*(?:type\s+)?(?:\*(?:\s*as\s+[\w$]+)?|\{{[^;'\"`(){{}}]*\}})\s*from\s*(?P<from>{string})".format(
+            string=_JS_STRING)),
+    "require": re.compile(r"require\s*\(\s*(?P<dynamic>{string})\s*\)".format(string=_JS_STRING)),
+}
+
+
+def _js_regex_allowed(s: str, pos: int) -> bool:
+    """
+    is `/` at pos a regex literal rather than division, by the token before
+    """
+    while pos and s[pos - 1] in " \t\r\n":
+        pos -= 1
+    if pos == 0:
+        return True
+    c = s[pos - 1]
+    if c in ")]}":
+        return False
+    if c.isalnum() or c in "_$":
+        word = REGEX_JS_TRAILING_WORD.search(s, max(0, pos - 16), pos)
+        return word is not None and word.group() in JS_REGEX_KEYWORDS
+    return True
+
+
+def scan_js_imports(s: str) -> Set[str]:
+    """
+    packages of ES imports, `export ... from`, require() and import() with
+    literal sources anywhere in JS/TS/JSX file, relative ones skipped
+    """
+    # brace depth of each open ${} of template literal
+    imports, pos, templates = set(), 0, []
+    while True:
+        m = (REGEX_JS_TEMPLATE_SCAN if templates else REGEX_JS_SCAN).search(s, pos)
+        if m is None:
+            break
+        kind, pos = m.lastgroup, m.end()
+        if kind == "quote":
+            quote = m.group()
+            if quote == "`":
+                pos = _skip_js_template(s, pos, templates)
+                continue
+            end = REGEX_JS_STRING_END[quote].search(s, pos)
+            # unterminated string lasts to the end of line
+            pos = len(s) if end is None else end.end()
+        elif kind == "comment":
+            close = "\n" if m.group() == "//" else "*/"
+            end = s.find(close, pos)
+            pos = len(s) if end < 0 else end + len(close)
+        elif kind == "slash":
+            if _js_regex_allowed(s, m.start()):
+                regex = REGEX_JS_REGEX.match(s, m.start())
+                if regex is not None:
+                    pos = regex.end()
+        elif kind == "brace":
+            if m.group() == "{":
+                templates[-1] += 1
+            elif templates[-1]:
+                templates[-1] -= 1
+            else:
+                templates.pop()
+                pos = _skip_js_template(s, pos, templates)
+        else:
+            statement = REGEX_JS_STATEMENT[m.group()].match(s, m.start())
+            if statement is None:
                 continue
-            r.add(token.arguments[0].value.split('/')[0])
-    return r
+            source = next(group for group in statement.groups() if group is not None)[1:-1]
+            if not source.startswith("."):
+                imports.add(source.split("/")[0])
+            pos = statement.end()
+    return imports
+
+
+def _skip_js_template(s: str, pos: int, templates: list) -> int:
+    """
+    :return: position after template text, ${ opens expression
+    """
+    m = REGEX_JS_TEMPLATE.match(s, pos)
+    if m.group("open"):
+        templates.append(0)
+    return m.end()
+
+
+def get_js_deps(s: str) -> Set[str]:
+    return scan_js_imports(s)
+
+
+# imports follow the package clause only, nothing after them is read
+# alternatives can't share text, comments are never split on backtracking
+_GO_SKIP = r"(?:\s|//[^\n]*(?![^\n])|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|;)*"
+_GO_SPEC = r"(?:(?:[^\W\d]\w*|\.){skip})?(?P<path>\"(?:[^\"\\\n]|\\.)*\"|`[^`]*`)".format(skip=_GO_SKIP)
+REGEX_GO_PACKAGE = re.compile(r"\ufeff?{skip}package\s+[^\W\d]\w*".format(skip=_GO_SKIP), re.DOTALL)
+REGEX_GO_IMPORT = re.compile(r"{skip}import\b{skip}".format(skip=_GO_SKIP), re.DOTALL)
+REGEX_GO_SPEC = re.compile(r"{skip}{spec}".format(skip=_GO_SKIP, spec=_GO_SPEC), re.DOTALL)
+REGEX_GO_GROUP_END = re.compile(r"{skip}\)".format(skip=_GO_SKIP), re.DOTALL)
+
+
+def scan_go_imports(s: str) -> Set[str]:
+    """
+    import paths of Go file: import declarations after the package clause,
+    single or grouped, named, dot and blank ones
+    """
+    m = REGEX_GO_PACKAGE.match(s)
+    if m is None:
+        return set()
+    imports, pos = set(), m.end()
+    while True:
+        m = REGEX_GO_IMPORT.match(s, pos)
+        if m is None:
+            return imports
+        pos = m.end()
+        grouped = s.startswith("(", pos)
+        pos += grouped
+        while True:
+            spec = REGEX_GO_SPEC.match(s, pos)
+            if spec is None:
+                break
+            path = spec.group("path")
+            imports.add(path[1:-1] if path[0] == "`" else ast.literal_eval(path))
+            pos = spec.end()
+            if not grouped:
+                break
+        if grouped:
+            end = REGEX_GO_GROUP_END.match(s, pos)
+            if end is None:
+                return imports
+            pos = end.end()
 
 
-def get_go_deps(file: str) -> Set[str]:
+def get_go_deps(s: str) -> Set[str]:
+    return scan_go_imports(s)
+
+
+# imports of files by kind of go list package field
+GO_LIST_FILES = {
+    "GoFiles": "Imports",
+    "CgoFiles": "Imports",
+    "TestGoFiles": "TestImports",
+    "XTestGoFiles": "XTestImports",
+}
+
+
+def go_list_imports(path: str) -> Dict[str, Set[str]]:
     """
-    run go list and parse stdout
-    :param repo: path to repos
-    :return: async genexp
+    imports of every Go file of packages under path by one `go list -json ./...`,
+    files excluded by build constraints of the host (IgnoredGoFiles) are left
+    out, their scanned imports stand. Needs Go toolchain
+    :return: path of file to import paths of its package
     """
-    data, _ = exec('go list --json {}'.format(os.path.basename(file)), cwd=os.path.dirname(file))
-    result = loads(data)
-    return set(result.get('Imports', []))
+    data, _ = exec('go list -e -json ./...', cwd=path)
+    decoder, pos, r = JSONDecoder(), 0, {}
+    # stream of concatenated objects, one per package
+    while True:
+        while pos < len(data) and data[pos].isspace():
+            pos += 1
+        if pos == len(data):
+            return r
+        package, pos = decoder.raw_decode(data, pos)
+        for files, imports in GO_LIST_FILES.items():
+            for file in package.get(files, ()):
+                r[os.path.join(package["Dir"], file)] = set(package.get(imports, ()))
+
+
+# installed packages and environments, not local
+VENDOR_DIRS = {
+    "node_modules", "site-packages", "dist-packages", ".venv", "venv", ".tox", ".nox", ".eggs", ".git",
+    "__pycache__",
+}
+# dirs with one of these are import roots
+PYTHON_PROJECT_FILES = ("setup.py", "setup.cfg", "pyproject.toml")
+
+
+@dataclass
+class ModuleIndex:
+    """
+    top-level names importable from repository. Import roots are the
+    repository, its src/ and dirs with setup.py, setup.cfg or pyproject.toml:
+    their modules and packages, namespace ones too, are local everywhere.
+    Modules and packages of deeper dirs are local for files of the same dir
+    only: scripts import them, relative imports are reported by name too.
+    JS names are workspace packages, scoped ones reduced as get_js_deps does
+    """
+
+    python: Set[str] = field(default_factory=set)
+    js: Set[str] = field(default_factory=set)
+    # dir below import roots to names of its modules and packages
+    siblings: Dict[str, Set[str]] = field(default_factory=dict)
+
+    # deps of lang are looked up in
+    LANGUAGES = {
+        "python": "python",
+        "js": "js",
+        "typescript": "js",
+    }
+
+    @classmethod
+    def build(cls, root: str, ignore_list: List['re.__Regex'] = list()) -> 'ModuleIndex':
+        index = cls()
+        root = os.path.abspath(root)
+        roots = {root, os.path.join(root, "src")}
+        # dir to names of its python modules and dirs with python files
+        names = defaultdict(set)
+        # dirs with python files
+        python_dirs = set()
+        for dirpath, dirnames, filenames in os.walk(root, topdown=True):
+            # virtualenv of any name
+            if "pyvenv.cfg" in filenames:
+                dirnames[:] = []
+                continue
+            dirnames[:] = [
+                d for d in dirnames
+                if d not in VENDOR_DIRS and not any(ignore.search(os.path.join(dirpath, d)) for ignore in ignore_list)
+            ]
+            if any(name in filenames for name in PYTHON_PROJECT_FILES):
+                roots.add(dirpath)
+            for filename in filenames:
+                if any(ignore.search(os.path.join(dirpath, filename)) for ignore in ignore_list):
+                    continue
+                name, ext = os.path.splitext(filename)
+                if ext in (".py", ".pyi") and name.isidentifier():
+                    if name != "__init__":
+                        names[dirpath].add(name)
+                    python_dirs.add(dirpath)
+                elif filename == "package.json":
+                    index.js.update(cls._workspace(os.path.join(dirpath, filename)))
+        seen = set()
+        for dirpath in python_dirs:
+            while dirpath != root and dirpath.startswith(root) and dirpath not in seen:
+                seen.add(dirpath)
+                dirpath, name = os.path.split(dirpath)
+                if name.isidentifier():
+                    names[dirpath].add(name)
+        for dirpath, found in names.items():
+            if dirpath in roots:
+                index.python.update(found)
+            else:
+                index.siblings[dirpath] = found
+        return index
 
+    @staticmethod
+    def _workspace(path: str) -> Set[str]:
+        try:
+            with open(path, "rb") as f:
+                name = json.load(f).get("name")
+        except (OSError, ValueError, AttributeError):
+            return set()
+        return {name.split("/")[0]} if isinstance(name, str) and name else set()
 
+    def is_local(self, lang: str, dep: str, path: Optional[str] = None) -> bool:
+        """
+        :param path: file importing dep, names of its dir are local for it
+        """
+        names = self.LANGUAGES.get(lang)
+        if names is None:
+            return False
+        if dep in getattr(self, names):
+            return True
+        return lang == "python" and path is not None and dep in self.siblings.get(os.path.dirname(path), ())
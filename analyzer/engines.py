@@ -0,0 +1,85 @@
+from array import array
+from math import log
+from typing import Dict, Tuple, Iterable, Iterator, Optional
+from zlib import crc32
+from .classifier import Model, TokenEngine, LOG_MIN
+
+
+__all__ = [
+    'TokenEngine',
+    'NGramEngine',
+    'HashedModel',
+]
+
+
+class HashedModel(Model):
+    """
+    model over hashed features: a feature is a row of the costs matrix,
+    so there is no vocabulary and memory doesn't depend on train set
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, classes: Dict[str, float], freq: Dict[Tuple[str, int], float],
+                buckets: int = 2 ** 15) -> 'HashedModel':
+        labels = list(classes.keys())
+        index = {label: i for i, label in enumerate(labels)}
+        width = len(labels)
+        costs = array("d", bytes(8 * width * buckets))
+        penalty = -log(LOG_MIN)
+        for (label, feature), value in freq.items():
+            if label in index:
+                costs[feature * width + index[label]] = -log(value) - penalty
+        priors = [-log(classes[label]) for label in labels]
+        return cls(labels, {}, priors, costs)
+
+    @property
+    def buckets(self) -> int:
+        return len(self.costs) // len(self.labels) if self.labels else 0
+
+    def ids(self, features: Iterable[int]) -> Iterable[int]:
+        return features
+
+    def index(self, feature: int) -> Optional[int]:
+        if isinstance(feature, int) and 0 <= feature < self.buckets:
+            return feature
+        return None
+
+    def tokens(self) -> Iterable[Tuple[int, int]]:
+        return ((i, i) for i in range(self.buckets))
+
+
+class NGramEngine(TokenEngine):
+    """
+    features are character n-grams of tokens hashed into a fixed number
+    of buckets (feature hashing). Unseen identifiers still share n-grams
+    with known ones
+    """
+
+    model = HashedModel
+
+    def __init__(self, n: int = 3, buckets: int = 2 ** 15):
+        if buckets & (buckets - 1):
+            raise ValueError("buckets should be power of 2")
+        self.n = n
+        self.buckets = buckets
+
+    def features(self, tokens: Iterable[str]) -> Iterator[int]:
+        n, mask = self.n, self.buckets - 1
+        for token in tokens:
+            s = " {} ".format(token).encode()
+            for i in range(max(1, len(s) - n + 1)):
+                yield crc32(s[i:i + n]) & mask
+
+    def lookup(self, model: HashedModel, encoding: Optional[str] = None) -> None:
+        # n-grams need text of tokens
+        return None
+
+    def compile(self, classes: Dict[str, float], freq: Dict[Tuple[str, int], float]) -> HashedModel:
+        return self.model.compile(classes, freq, self.buckets)
+
+    def _check(self, model: HashedModel) -> HashedModel:
+        if model.buckets != self.buckets:
+            raise ValueError("model has {} buckets, engine expects {}".format(model.buckets, self.buckets))
+        return model
@@ -0,0 +1,223 @@
+from collections import defaultdict
+from typing import List, Tuple, Dict, Optional
+import tempfile
+import time
+from .classifier import Classifier
+
+
+__all__ = [
+    'holdout_split',
+    'kfold_split',
+    'measure',
+    'cross_validate',
+    'prune_report',
+]
+
+
+def holdout_split(files: List[Tuple[str, str]], holdout: float) -> Tuple[List, List]:
+    """
+    deterministic stratified split: held-out files of each class are spread
+    evenly, at least one of every class with 2 or more files and never all
+    :param files: pairs of file and class
+    :param holdout: fraction of held-out files
+    :return: train and held-out files
+    """
+    by_class = defaultdict(list)
+    for fp, label in sorted(files):
+        by_class[label].append((fp, label))
+    train, test = [], []
+    for items in by_class.values():
+        n = len(items)
+        k = min(max(1, int(round(n * holdout))), n - 1)
+        for i, item in enumerate(items):
+            # k of n, the last one of every n / k
+            (test if (i + 1) * k // n > i * k // n else train).append(item)
+    return train, test
+
+
+def read_samples(files: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    :return: list of (document, class)
+    """
+    samples = []
+    for fp, label in files:
+        with open(fp, "r") as f:
+            samples.append((f.read(), label))
+    return samples
+
+
+def kfold_split(files: List[Tuple[str, str]], k: int) -> List[Tuple[List, List]]:
+    """
+    deterministic stratified k-fold split: files of each class are dealt
+    round-robin into k folds
+    :param files: pairs of file and class
+    :return: k pairs of train and test files
+    """
+    if k < 2:
+        raise ValueError("k should be at least 2")
+    folds = [[] for _ in range(k)]
+    by_class = defaultdict(list)
+    for fp, label in sorted(files):
+        by_class[label].append((fp, label))
+    for items in by_class.values():
+        for i, item in enumerate(items):
+            folds[i % k].append(item)
+    return [
+        ([item for j, fold in enumerate(folds) if j != i for item in fold], folds[i])
+        for i in range(k)
+    ]
+
+
+def _measure(classifier: Classifier, samples: List[Tuple[str, str]]) -> Tuple[Dict, List[str]]:
+    """
+    time classification of documents end to end (tokenize and score) and
+    scoring of their features alone
+    :return: raw stats (seconds, counts) and predicted labels
+    """
+    data = classifier.dumpb()
+    with tempfile.NamedTemporaryFile(suffix=".kdm") as f:
+        f.write(data)
+        f.flush()
+        start = time.perf_counter()
+        loaded = type(classifier).load(f.name)
+        loaded.model
+        load_time = time.perf_counter() - start
+    documents = [document for document, _ in samples]
+    start = time.perf_counter()
+    labels = loaded.classify_many(documents)
+    elapsed = time.perf_counter() - start
+    features = [list(loaded.features(document)) for document in documents]
+    start = time.perf_counter()
+    list(loaded.model.predict(features))
+    score_time = time.perf_counter() - start
+    stats = {
+        "rows": len(loaded.model.costs) // max(1, len(loaded.model.labels)),
+        "size": len(data),
+        "load_time": load_time,
+        "elapsed": elapsed,
+        "score_time": score_time,
+        "docs": len(samples),
+        "tokens": sum(len(feats) for feats in features),
+    }
+    return stats, labels
+
+
+def _throughput(stats: Dict) -> Dict[str, float]:
+    elapsed = max(stats["elapsed"], 1e-9)
+    return {
+        "docs_per_sec": round(stats["docs"] / elapsed, 1),
+        "tokens_per_sec": round(stats["tokens"] / elapsed, 1),
+        "score_docs_per_sec": round(stats["docs"] / max(stats["score_time"], 1e-9), 1),
+    }
+
+
+def measure(classifier: Classifier, samples: List[Tuple[str, str]]) -> Dict[str, float]:
+    """
+    size, load time, throughput (end to end and of scoring alone) and
+    accuracy of classifier
+    :param samples: held-out documents
+    """
+    stats, labels = _measure(classifier, samples)
+    correct = sum(1 for label, (_, expected) in zip(labels, samples) if label == expected)
+    return dict(
+        rows=stats["rows"],
+        size=stats["size"],
+        load_ms=round(stats["load_time"] * 1000, 3),
+        accuracy=round(correct / len(samples), 4) if samples else None,
+        **_throughput(stats)
+    )
+
+
+def _run_fold(args) -> Tuple[Dict, Dict[Tuple[str, str], int]]:
+    """
+    train on one fold, test on the rest
+    :return: raw stats and confusion counts by (expected, predicted)
+    """
+    classifier_cls, train, test = args
+    start = time.perf_counter()
+    classifier = classifier_cls.from_counts(classifier_cls.count_files(train))
+    train_time = time.perf_counter() - start
+    samples = read_samples(test)
+    stats, labels = _measure(classifier, samples)
+    stats["train_time"] = train_time
+    confusion = defaultdict(int)
+    for label, (_, expected) in zip(labels, samples):
+        confusion[expected, label] += 1
+    return stats, dict(confusion)
+
+
+def cross_validate(classifier_cls, samples_dir: str, k: int = 5, jobs: int = 1) -> Dict:
+    """
+    stratified k-fold cross-validation, folds run in `jobs` processes
+    :return: accuracy, per-class precision/recall, confusion matrix
+             (expected -> predicted -> count) and speed summed over folds
+    """
+    folds = [(classifier_cls, train, test)
+             for train, test in kfold_split(list(classifier_cls.sample_files(samples_dir)), k)]
+    if jobs > 1:
+        from .shared import pool_context
+        with pool_context().Pool(min(jobs, k)) as pool:
+            results = pool.map(_run_fold, folds)
+    else:
+        results = [_run_fold(fold) for fold in folds]
+
+    totals = defaultdict(float)
+    confusion = defaultdict(int)
+    for stats, fold_confusion in results:
+        for key in ("load_time", "train_time", "elapsed", "score_time", "docs", "tokens"):
+            totals[key] += stats[key]
+        for key, count in fold_confusion.items():
+            confusion[key] += count
+
+    labels = sorted({label for pair in confusion for label in pair})
+    classes = {}
+    for label in labels:
+        tp = confusion.get((label, label), 0)
+        predicted = sum(confusion.get((other, label), 0) for other in labels)
+        expected = sum(confusion.get((label, other), 0) for other in labels)
+        classes[label] = {
+            "precision": round(tp / predicted, 4) if predicted else None,
+            "recall": round(tp / expected, 4) if expected else None,
+            "support": expected,
+        }
+    correct = sum(confusion.get((label, label), 0) for label in labels)
+    docs = int(totals["docs"])
+    return dict(
+        folds=k,
+        docs=docs,
+        accuracy=round(correct / docs, 4) if docs else None,
+        rows=_mean(stats["rows"] for stats, _ in results),
+        size=_mean(stats["size"] for stats, _ in results),
+        load_ms=round(totals["load_time"] * 1000 / k, 3),
+        train_ms=round(totals["train_time"] * 1000 / k, 3),
+        classes=classes,
+        confusion={
+            expected: {
+                predicted: confusion[expected, predicted]
+                for predicted in labels
+                if confusion.get((expected, predicted))
+            }
+            for expected in labels
+        },
+        **_throughput(totals)
+    )
+
+
+def _mean(values) -> Optional[float]:
+    values = list(values)
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def prune_report(classifier_cls, samples_dir: str, ks: List[int], holdout: float = 0.25) -> List[Dict]:
+    """
+    train on a part of samples dir and measure pruned models on held-out files
+    :param ks: numbers of tokens to keep
+    """
+    train, test = holdout_split(list(classifier_cls.sample_files(samples_dir)), holdout)
+    classifier = classifier_cls.from_counts(classifier_cls.count_files(train))
+    samples = read_samples(test)
+    report = []
+    for k in sorted(ks) + [None]:
+        pruned = classifier if k is None else classifier.prune(k)
+        report.append(dict(k=k, **measure(pruned, samples)))
+    return report
@@ -1,14 +1,19 @@
 from __future__ import division
 import re
 from .classifier import Classifier
-from .utils import extract, int_or_zero, extract_pipeline, search, exec
-from typing import NamedTuple, Tuple, List, Iterator
+from .utils import extract, int_or_zero, extract_pipeline, search, exec, Rule, Scanner, trie_pattern, LRUCache
+from typing import NamedTuple, Tuple, List, Iterator, Callable, Sequence, Iterable, Dict
 from collections import defaultdict
+from itertools import compress
+from array import array
 import os
 import io
 
 __all__ = [
     'CommitMessageClassifier',
+    'MemoizedClassifier',
+    'History',
+    'normalize_message',
     'extract_commits',
     'blame',
     'parse_blame_line_author',
@@ -17,6 +22,8 @@ __all__ = [
 
 REGEX_MESSAGE = re.compile(r'\s{4}(.*)')
 REGEX_NUMSTAT = re.compile(r'(\d+|-)\s+(\d+|-)\s+(.*)')
+# REGEX_NUMSTAT for every line of stats block at once
+REGEX_NUMSTAT_LINES = re.compile(r'^(\d+|-)[^\S\n]+(\d+|-)[^\S\n]+(.*)$', re.MULTILINE)
 REGEX_AUTHOR = re.compile('author\s(.+)\s<(.*)>\s(\d+)\s([+\-]\d{4})')
 REGEX_COMMITER = re.compile('committer\s(.+)\s<(.*)>\s(\d+)\s([+\-]\d{4})')
 REGEX_COMMIT = re.compile(r'''(commit\s(?P<commit>[a-f0-9]+)\ntree\s(?P<tree>[a-f0-9]+)\n(?P<parents>(parent\ [a-f0-9]+\n)*)(?P<author>author\s+(.+)\s+<(.*)>\s+(\d+)\s+([+\-]\d{4})\n)(?P<committer>committer\s+(.+)\s+<(.*)>\s+(\d+)\s+([+\-]\d{4})\n)(gpgsig\s(.*)\n\s(\n\s[^-]+)(.*)\n)?\n(?P<message>(\s{4}[^\n]*\n)*)\n(?P<stats>(^(\d+|-)\s+(\d+|-)\s+(.*)$\n)*))''', re.MULTILINE | re.VERBOSE)
@@ -40,6 +47,9 @@ REGEX_TESTS = re.compile(r"((test(((-)?(case|suite))|s)?)|(e2e))\S?(\s+)?", re.I
 REGEX_WORD = re.compile("[A-z]+")
 REGEX_SKIP = re.compile(r"(\s|\n|;|\{|\}|\(|\)|\[|\]|\,|\?|\!|\$|\\)+")
 
+REGEX_DIGITS = re.compile(r"\d+")
+REGEX_SPACES = re.compile(r"\s+")
+
 REGEX_BLAME = re.compile(r"^\^?\w+\s\((?P<author>.*)\s\d{4}\-\d{2}\-\d{2}\s\d{2}\:\d{2}\:\d{2}\s(\+|-)?\d{4}\s|\d{2}\)")
 
 Stat = NamedTuple("Stat", (
@@ -103,6 +113,23 @@ def extract_commits(s: str) -> Iterator[Commit]:
         yield _prepare_commit(**kwargs)
 
 
+def _normalize_digits(match: 're.__Match') -> str:
+    digits = match.group()
+    # "2" of e2e is a keyword; a test marker may consume one digit after it
+    if digits == "2":
+        return digits
+    return "00" if len(digits) > 1 else "0"
+
+
+def normalize_message(s: str) -> str:
+    """
+    key of message for memoized classification: numbers (hashes, versions,
+    ticket ids) and whitespace are collapsed so that tokens of
+    GITLOG_PIPELINE don't change
+    """
+    return REGEX_SPACES.sub(" ", REGEX_DIGITS.sub(_normalize_digits, s)).strip()
+
+
 def extract_ticket(s: str, pos: int):
     match = extract(s, REGEX_TICKET, pos=pos)
     return "#!TICKET", match.end()
@@ -206,8 +233,190 @@ GITLOG_PIPELINE = (
 )
 
 
+def emit_marker(marker: str) -> Callable[[str], str]:
+    return lambda token: marker
+
+
+# single pass equivalent of GITLOG_PIPELINE
+GITLOG_SCANNER = Scanner([
+    Rule(REGEX_SKIP, None, None),
+    Rule(REGEX_DOCS, None, emit_marker("#!DOCS")),
+    Rule(REGEX_TESTS, None, emit_marker("#!TEST")),
+    Rule(REGEX_VERSION, None, emit_marker("#!VERSION")),
+    Rule(REGEX_WORD, None, True),
+])
+
+# every match of REGEX_DOCS, REGEX_TESTS or REGEX_VERSION contains one of
+# these keywords or a digit; keep in sync with the regexes
+MARKER_KEYWORDS = (".md", ".rst", "readme", "changelog", "doc", "test", "e2e")
+REGEX_MARKER_KEYWORD = re.compile(r"(?i:{})|\d".format(trie_pattern(MARKER_KEYWORDS)))
+
+# pipeline without markers: skip is tried before a word, so a word can't
+# start with "[", "\" or "]" of REGEX_SKIP, but continues over them
+REGEX_WORD_TOKEN = re.compile(r"[A-Z^_`a-z][A-z]*")
+
+
+def extract_message_tokens(s: str):
+    """
+    tokens of GITLOG_PIPELINE: messages without marker keywords are split
+    by one findall, the rest are scanned with GITLOG_SCANNER
+    """
+    if REGEX_MARKER_KEYWORD.search(s) is None:
+        return REGEX_WORD_TOKEN.findall(s)
+    return GITLOG_SCANNER.scan(s)
+
+
 class CommitMessageClassifier(Classifier):
 
     @staticmethod
     def extract(s: str):
-        return extract_pipeline(GITLOG_PIPELINE, s, pos=0)
+        return extract_message_tokens(s)
+
+
+class MemoizedClassifier:
+    """
+    classify_many in front of a commit message classifier: a batch is
+    deduplicated by normalize_message and only messages not in the LRU
+    cache are classified
+    """
+
+    def __init__(self, classify_many: Callable[[List[str]], List[str]], cache: LRUCache):
+        """
+        :param classify_many: classifier of list of messages, e.g. of
+                              CommitMessageClassifier or of worker pool
+        """
+        self.classify_many_uncached = classify_many
+        self.cache = cache
+        self.messages = 0
+        self.classified = 0
+
+    def classify_many(self, messages: Sequence[str]) -> List[str]:
+        keys = [normalize_message(message) for message in messages]
+        labels, missing = {}, {}
+        for key, message in zip(keys, messages):
+            if key in labels or key in missing:
+                continue
+            label = self.cache.get(key)
+            if label is None:
+                missing[key] = message
+            else:
+                labels[key] = label
+        if missing:
+            for key, label in zip(missing, self.classify_many_uncached(list(missing.values()))):
+                labels[key] = label
+                self.cache.put(key, label)
+        self.messages += len(messages)
+        self.classified += len(missing)
+        return [labels[key] for key in keys]
+
+    def classify(self, message: str) -> str:
+        return self.classify_many([message])[0]
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        share of messages not classified: duplicates in batch or cache hits
+        """
+        return self.messages and 1 - self.classified / self.messages
+
+
+class History:
+    """
+    commit history as columns: a row per commit (hash, author, message)
+    and a row per numstat line (commit row, file, updated lines), authors
+    and files interned to ids. Commits are classified in one batch and
+    updates are grouped sums over the rows
+    """
+
+    def __init__(self):
+        self.commits = []
+        self.messages = []
+        # author id of commit row
+        self.authors = array("L")
+        self.author_names = []
+        # commit row, file id and inserted + deleted lines of numstat row
+        self.stat_commits = array("L")
+        self.stat_files = array("L")
+        self.stat_updates = array("Q")
+        self.filenames = []
+        self._author_ids = {}
+        self._file_ids = {}
+
+    def __len__(self):
+        return len(self.commits)
+
+    def append(self, commit: str, author: str, message: str, stats: Iterable[Tuple[int, int, str]]):
+        row = len(self.commits)
+        self.commits.append(commit)
+        self.messages.append(message)
+        author_id = self._author_ids.get(author)
+        if author_id is None:
+            author_id = self._author_ids[author] = len(self.author_names)
+            self.author_names.append(author)
+        self.authors.append(author_id)
+        file_ids = self._file_ids
+        add_commit, add_file, add_updates = self.stat_commits.append, self.stat_files.append, self.stat_updates.append
+        for insert, delete, filename in stats:
+            file_id = file_ids.get(filename)
+            if file_id is None:
+                file_id = file_ids[filename] = len(self.filenames)
+                self.filenames.append(filename)
+            add_commit(row)
+            add_file(file_id)
+            add_updates(insert + delete)
+
+    @classmethod
+    def from_commits(cls, commits: Iterable[Commit]) -> 'History':
+        history = cls()
+        for commit in commits:
+            history.append(commit.commit, commit.author.name, commit.message, commit.stats)
+        return history
+
+    @classmethod
+    def from_log(cls, s: str) -> 'History':
+        """
+        columns of `git log --numstat --pretty=raw` output, same as of
+        extract_commits, without Commit and Stat per row
+        """
+        history = cls()
+        for match in REGEX_COMMIT.finditer(s):
+            stats = [
+                (int_or_zero(insert), int_or_zero(delete), filename)
+                for insert, delete, filename in REGEX_NUMSTAT_LINES.findall(match.group("stats"))
+            ]
+            history.append(
+                match.group("commit"),
+                extract_author(match.group("author")).name,
+                extract_message(match.group("message")),
+                stats,
+            )
+        return history
+
+    def updates(self, labels: Sequence[str], author: Callable[[str], str],
+                known: Callable[[str], bool]) -> Tuple[Dict[str, int], Dict[Tuple[str, str], int]]:
+        """
+        :param labels: class of every commit
+        :param author: name of author by name in history (aliases)
+        :param known: files to count
+        :return: updated lines per file and per (author, class), in order
+                 of first numstat row
+        """
+        files = [known(filename) for filename in self.filenames]
+        authors = [author(name) for name in self.author_names]
+        file_sums = [0] * len(self.filenames)
+        commit_sums = [0] * len(self.commits)
+        counted = bytearray(len(self.commits))
+        for row, file_id, updates in zip(self.stat_commits, self.stat_files, self.stat_updates):
+            if files[file_id]:
+                file_sums[file_id] += updates
+                commit_sums[row] += updates
+                counted[row] = 1
+        per_file = {
+            filename: updates
+            for filename, updates, counts in zip(self.filenames, file_sums, files) if counts
+        }
+        per_author_class = {}
+        for row in compress(range(len(self.commits)), counted):
+            key = (authors[self.authors[row]], labels[row])
+            per_author_class[key] = per_author_class.get(key, 0) + commit_sums[row]
+        return per_file, per_author_class
@@ -2,11 +2,15 @@ from __future__ import division
 import argparse
 from collections import defaultdict
 import json
-from .polyglot import Polyglot
+from .polyglot import Polyglot, NGramPolyglot, MAX_READ_SIZE
 from .gitlog import CommitMessageClassifier
 from .utils import scandir
+from itertools import chain
 import logging
-from deps import *
+import re
+from .deps import *
+from .classifier import convert
+from .evaluation import prune_report, cross_validate
 
 logging.basicConfig(level = logging.DEBUG)
 
@@ -22,36 +26,64 @@ CONFIG = {
 
 
 
-def train_polyglot_db(samples_dir: str, dst: str):
-    classifier = Polyglot.from_samples(samples_dir)
+POLYGLOT_ENGINES = {
+    'token': Polyglot,
+    'ngram': NGramPolyglot,
+}
+
+
+def train_polyglot_db(samples_dir: str, dst: str, jobs: int = 1, engine: str = 'token'):
+    classifier = POLYGLOT_ENGINES[engine].from_samples(samples_dir, jobs)
     data = classifier.dumps(indent=4)
     with open(dst, "w") as f:
         f.write(data)
 
 
-def polyglot_detect_file(db: str, filepath: str):
-    with open(db, "r") as f:
-        data = f.read()
-    classifier = Polyglot.loads(data)
-    with open(filepath, "r") as f:
-        r = classifier.classify(f.read())
-    print(r[0][0])
-
-
-def dump_gitlog_db(samples_dir: str, dst: str):
-    classifier = CommitMessageClassifier.from_samples(samples_dir)
+def update_db(classifier_cls, db: str, dst: str, samples_dir: str = None, repo: str = None):
+    classifier = classifier_cls.load(db)
+    samples = []
+    if samples_dir:
+        samples.append(classifier_cls.build_samples(samples_dir))
+    if repo:
+        samples.append(classifier.unambiguous_samples(repo, [re.compile(i) for i in CONFIG['ignore']]))
+    classifier = classifier.update(chain(*samples))
+    with open(dst, "wb") as f:
+        if dst.endswith(".kdm"):
+            f.write(classifier.dumpb())
+        else:
+            f.write(classifier.dumps(indent=4).encode())
+
+
+def prune_db(classifier_cls, samples_dir: str, ks: str, holdout: float,
+             db: str = None, keep: int = None, dst: str = None):
+    report = prune_report(classifier_cls, samples_dir, [int(k) for k in ks.split(",")], holdout)
+    print(json.dumps(report, indent=4))
+    if dst and keep:
+        classifier = classifier_cls.load(db).prune(keep)
+        with open(dst, "wb") as f:
+            if dst.endswith(".kdm"):
+                f.write(classifier.dumpb())
+            else:
+                f.write(classifier.dumps(indent=4).encode())
+
+
+def eval_db(classifier_cls, samples_dir: str, k: int, jobs: int = 1, dst: str = None):
+    report = cross_validate(classifier_cls, samples_dir, k, jobs)
+    data = json.dumps(report, indent=4, sort_keys=True)
+    if dst:
+        with open(dst, "w") as f:
+            f.write(data)
+    print(data)
+
+
+def dump_gitlog_db(samples_dir: str, dst: str, jobs: int = 1):
+    classifier = CommitMessageClassifier.from_samples(samples_dir, jobs)
     print(classifier.classify("ignore babel config"))
     data = classifier.dumps(indent=4)
     with open(dst, "w") as f:
         f.write(data)
 
 
-def gitlog_analyze_commit(db: str):
-    with open(db, "r") as f:
-        data = f.read()
-    classifier = Polyglot.loads(data)
-
-
 def analyze_file(file: str):
     pass
 
@@ -69,12 +101,11 @@ def analyze_repo(args):
 
     lang_to_deps = {
         "js": get_js_deps,
+        "typescript": get_js_deps,
         "python": get_python_deps,
         "golang": get_go_deps,
     }
 
-    MAX_READ_SIZE = 2 ** 17
-
     def clssify(filepath):
         logging.info("open {}".format(filepath))
         with open(filepath, "r") as f:
@@ -126,6 +157,13 @@ def analyze_repo(args):
     print(json.dumps(result, indent=4, sort_keys=True ))
 
 
+def _add_eval_arguments(parser, samples_dir: str):
+    parser.add_argument('--samples', dest="samples", type=str, help='labeled samples dir', default=samples_dir)
+    parser.add_argument('--k', dest="k", type=int, help='number of folds', default=5)
+    parser.add_argument('--jobs', '-j', dest="jobs", type=int, help='worker processes', default=1)
+    parser.add_argument('--out', dest="file", type=str, help='write JSON report to file')
+
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze repo')
     # parser.add_argument('--file', type=str, required=False, help='analyze file')
@@ -140,10 +178,39 @@ def main():
     train_polyglot_parser = train_polyglot_subparsers.add_parser('train', help='train classifier on samples')
     train_polyglot_parser.add_argument('--out', dest="file", type=str, help='destination file', default='polyglot-classifier.json')
     train_polyglot_parser.add_argument('--samples', dest="samples", type=str, help='samples dir', default='polyglot-samples')
-
-    # detect
-    detect_polyglot_parser = train_polyglot_subparsers.add_parser('detect', help='train classifier on samples')
-    detect_polyglot_parser.add_argument('file', type=str, help='file for detection')
+    train_polyglot_parser.add_argument('--jobs', '-j', dest="jobs", type=int, help='worker processes', default=1)
+    train_polyglot_parser.add_argument('--engine', dest="engine", choices=sorted(POLYGLOT_ENGINES),
+                                       help='features: tokens or hashed character n-grams', default='token')
+
+    # update
+    update_polyglot_parser = train_polyglot_subparsers.add_parser('update', help='fold new samples into classifier')
+    update_polyglot_parser.add_argument('--db', dest="db", type=str, help='classifier', default='polyglot-classifier.json')
+    update_polyglot_parser.add_argument('--out', dest="file", type=str, help='destination file (.json or .kdm)',
+                                        default='polyglot-classifier.json')
+    update_polyglot_parser.add_argument('--samples', dest="samples", type=str, help='labeled samples dir')
+    update_polyglot_parser.add_argument('--repo', dest="update_repo", type=str,
+                                        help='repo, files with known extension are used as samples')
+
+    # prune
+    prune_polyglot_parser = train_polyglot_subparsers.add_parser(
+        'prune', help='keep most informative tokens, report size/speed/accuracy per K')
+    prune_polyglot_parser.add_argument('--samples', dest="samples", type=str, help='samples dir',
+                                       default='polyglot-samples')
+    prune_polyglot_parser.add_argument('--k', dest="ks", type=str, help='comma separated numbers of tokens',
+                                       default='100,250,500,1000,2000')
+    prune_polyglot_parser.add_argument('--holdout', dest="holdout", type=float, help='held-out fraction',
+                                       default=0.25)
+    prune_polyglot_parser.add_argument('--db', dest="db", type=str, help='classifier to prune',
+                                       default='polyglot-classifier.json')
+    prune_polyglot_parser.add_argument('--keep', dest="keep", type=int, help='tokens to keep in --out')
+    prune_polyglot_parser.add_argument('--out', dest="file", type=str, help='pruned classifier (.json or .kdm)')
+
+    # eval
+    eval_polyglot_parser = train_polyglot_subparsers.add_parser(
+        'eval', help='k-fold cross-validation: precision/recall, confusion matrix and speed as JSON')
+    _add_eval_arguments(eval_polyglot_parser, 'polyglot-samples')
+    eval_polyglot_parser.add_argument('--engine', dest="engine", choices=sorted(POLYGLOT_ENGINES),
+                                      help='features: tokens or hashed character n-grams', default='token')
     parser.add_argument('--db', dest='polyglot_db',
                                         help='polyglot samples database',
                                         default='polyglot-classifier.json')
@@ -156,36 +223,67 @@ def main():
     train_gitlog_parser = train_gitlog_subparsers.add_parser('train', help='train classifier on samples')
     parser.add_argument('--out', dest="gitlog_db", type=str, help='destination file',
                                        default='classifier-gitlog.json')
-    train_gitlog_parser.add_argument('--samples', dest="gitlog_db", type=str, help='samples dir',
+    train_gitlog_parser.add_argument('--samples', dest="samples", type=str, help='samples dir',
                                        default='gitlog-samples')
-
-    # detect
-    detect_gitlog_parser = train_gitlog_subparsers.add_parser('check', help='train classifier on samples')
-    detect_gitlog_parser.add_argument('--db', dest='gitlog_db',
-                                        help='gitlog samples database',
-                                        default='classifier-gitlog.json')
+    train_gitlog_parser.add_argument('--file', dest="file", type=str, help='destination file',
+                                       default='classifier-gitlog.json')
+    train_gitlog_parser.add_argument('--jobs', '-j', dest="jobs", type=int, help='worker processes', default=1)
+
+    # update
+    update_gitlog_parser = train_gitlog_subparsers.add_parser('update', help='fold labeled messages into classifier')
+    update_gitlog_parser.add_argument('--db', dest="db", type=str, help='classifier', default='classifier-gitlog.json')
+    update_gitlog_parser.add_argument('--out', dest="file", type=str, help='destination file (.json or .kdm)',
+                                      default='classifier-gitlog.json')
+    update_gitlog_parser.add_argument('--samples', dest="samples", type=str, help='labeled messages dir', required=True)
+
+    # eval
+    eval_gitlog_parser = train_gitlog_subparsers.add_parser(
+        'eval', help='k-fold cross-validation: precision/recall, confusion matrix and speed as JSON')
+    _add_eval_arguments(eval_gitlog_parser, 'gitlog-samples')
+
+    # convert
+    convert_parser = subparsers.add_parser('convert', help='convert JSON classifier to binary format')
+    convert_parser.add_argument('src', type=str, help='JSON classifier')
+    convert_parser.add_argument('dst', type=str, help='destination file (.kdm)')
+    convert_parser.add_argument('--engine', dest="engine", choices=sorted(POLYGLOT_ENGINES),
+                                help='features: tokens or hashed character n-grams', default='token')
 
     # analyze
     analyze_parser = subparsers.add_parser('analyze', help='analyze repo')
     parser.add_argument('--repo', dest='repo', type=str, default='.', help='analyze repo')
 
-    start = None
     args = parser.parse_args()
     if args.cmd == 'polyglot':
 
         if args.polyglot_cmd == 'train':
-            start = train_polyglot_db(args.samples, args.file)
-        if args.polyglot_cmd == 'detect':
-            start = polyglot_detect_file(args.polyglot_db, args.file)
+            train_polyglot_db(args.samples, args.file, args.jobs, args.engine)
+            return
+        if args.polyglot_cmd == 'update':
+            update_db(Polyglot, args.db, args.file, args.samples, args.update_repo)
+            return
+        if args.polyglot_cmd == 'prune':
+            prune_db(Polyglot, args.samples, args.ks, args.holdout, args.db, args.keep, args.file)
+            return
+        if args.polyglot_cmd == 'eval':
+            eval_db(POLYGLOT_ENGINES[args.engine], args.samples, args.k, args.jobs, args.file)
+            return
+
+    if args.cmd == 'convert':
+        convert(args.src, args.dst, POLYGLOT_ENGINES[args.engine])
+        return
 
     if args.cmd == 'gitlog':
 
         if args.gitlog_cmd == 'train':
-            start = dump_gitlog_db(args.gitlog_samples, args.gitlog_file)
-        if args.gitlog_cmd == 'check':
-            start = gitlog_analyze_commit(args.gitlog_db)
-    if not start:
-        start = analyze_repo(args)
+            dump_gitlog_db(args.samples, args.file, args.jobs)
+            return
+        if args.gitlog_cmd == 'update':
+            update_db(CommitMessageClassifier, args.db, args.file, args.samples)
+            return
+        if args.gitlog_cmd == 'eval':
+            eval_db(CommitMessageClassifier, args.samples, args.k, args.jobs, args.file)
+            return
+    analyze_repo(args)
 
 
 if __name__ == '__main__':
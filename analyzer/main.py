@@ -1,18 +1,26 @@
 from argparse import ArgumentParser
-from .config import Config, Module
-from .utils import scandir, exec
-from .polyglot import Polyglot
-from .deps import get_python_deps, get_js_deps
+from .utils import scandir, exec, chunks
+from .classifier import MARGIN
 from dataclasses import dataclass
-from .gitlog import CommitMessageClassifier, extract_commits, blame
-from collections import defaultdict
+from collections import defaultdict, Counter
+from functools import lru_cache
+import hashlib
 import logging
 import os
-from typing import Set
-import pathlib
+from typing import Set, Dict, List, Optional, Tuple, TYPE_CHECKING
 import json
 import sys
 
+if TYPE_CHECKING:
+    from .boosting import CatBoostCommitClassifier
+    from .cache import FileCache
+    from .config import Config, Module
+    from .deps import ModuleIndex
+    from .gitlog import CommitMessageClassifier, MemoizedClassifier
+    from .polyglot import Polyglot
+    from .shared import SharedModel
+    from .utils import LRUCache
+
 logging.basicConfig(level=logging.DEBUG, stream=sys.stderr)
 
 # TODO: fooo
@@ -27,21 +35,289 @@ class File:
     updates: float = 0
 
 
-MAX_READ_SIZE = 2 ** 16
+PREFIX_READ_SIZE = 2 ** 12
+# dependencies are parsed from the head of a file only
+DEPS_READ_SIZE = 2 ** 16
+# end of file read for modelines
+TAIL_READ_SIZE = 2 ** 10
+BATCH_SIZE = 256
+# normalized commit messages with known class
+GITLOG_CACHE_SIZE = 2 ** 16
+# blobs with known language and dependencies
+FILE_CACHE_SIZE = 2 ** 18
+# bump when detect_file gives other results for the same models
+FILE_CACHE_VERSION = 1
 DEFAULT_CONFIG_PATH = ".kd-config.json"
+# shipped models
+MODEL_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+
+def _model_path(name: str, model_dir: str = MODEL_DIR) -> str:
+    """
+    prefer compact binary model (see classifier.convert) over JSON one,
+    unless JSON is newer or not the one it was converted from (retrained)
+    """
+    from .classifier import source_digest
+    path = os.path.join(model_dir, name)
+    binary = os.path.splitext(path)[0] + ".kdm"
+    if not os.path.exists(binary):
+        return path
+    if not os.path.exists(path):
+        return binary
+    if os.path.getmtime(binary) >= os.path.getmtime(path) and source_digest(binary) == _file_digest(path):
+        return binary
+    logging.warning("%s is stale, %s is loaded", binary, path)
+    return path
+
+
+@lru_cache(maxsize=None)
+def get_polyglot() -> 'Polyglot':
+    from .polyglot import Polyglot
+    return Polyglot.load(_model_path("polyglot-classifier.json"))
+
+
+@lru_cache(maxsize=None)
+def get_gitlog() -> 'CommitMessageClassifier':
+    from .gitlog import CommitMessageClassifier
+    return CommitMessageClassifier.load(_model_path("classifier-gitlog.json"))
+
+
+@lru_cache(maxsize=None)
+def get_catboost() -> 'CatBoostCommitClassifier':
+    from .boosting import CatBoostCommitClassifier
+    # catboost format, no binary counterpart
+    return CatBoostCommitClassifier.load(os.path.join(MODEL_DIR, "cat_model"))
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
 
-polyglot = Polyglot.load(os.path.join(os.path.abspath(os.path.dirname(__file__)), "polyglot-classifier.json"))
+def _file_cache_version(margin: float, strategy: str) -> str:
+    """
+    digest of models, extractors and options detect_file results depend on
+    """
+    from . import classifier, deps, polyglot, resolution, utils
+    h = hashlib.sha1(json.dumps([FILE_CACHE_VERSION, margin, strategy, PREFIX_READ_SIZE, DEPS_READ_SIZE,
+                                 TAIL_READ_SIZE, polyglot.MAX_READ_SIZE]).encode())
+    # sources of tokenizer, resolution, scoring and dependency parsers
+    sources = (classifier.__file__, deps.__file__, polyglot.__file__, resolution.__file__, utils.__file__)
+    for path in (_model_path("polyglot-classifier.json"), resolution.RESOLUTION_PATH, *sources):
+        h.update(_file_digest(path).encode())
+    return h.hexdigest()
 
-gitlog = CommitMessageClassifier.load(
-    os.path.join(os.path.abspath(os.path.dirname(__file__)), "classifier-gitlog.json"))
+
+GITLOG_BACKENDS = ("bayes", "catboost")
+# see polyglot.read_windows, not imported to keep startup fast
+READ_STRATEGIES = ("head", "head+tail", "strided")
 
 
 def init(repo: str):
+    from .config import Config
     with open(os.path.join(repo, DEFAULT_CONFIG_PATH), "w") as f:
         f.write(Config.generate(repo).to_json())
 
 
-def analyze_module(module: Module, config: Config):
+def detect_file(file: str, polyglot: 'Polyglot', margin: float = MARGIN, strategy: str = "head"):
+    """
+    detect language and dependencies of file: filename, extension, shebang
+    and modeline are tried first, the file is tokenized only if they are ambiguous
+    :return: File, count of tokens used for detection and resolution stage
+             ("tokenized" if none)
+    """
+    from .deps import get_python_deps, get_js_deps, get_go_deps
+    from .polyglot import MAX_READ_SIZE
+    deps_of = {
+        "python": get_python_deps,
+        "js": get_js_deps,
+        "typescript": get_js_deps,
+        "golang": get_go_deps,
+    }
+    logging.info("analyze {}".format(file))
+    lang, stage = polyglot.resolve(file)
+    tokens = 0
+    unreadable = File(file, "UNKNOWN", set()), 0, "unreadable"
+    # only reads are guarded, errors of classifier propagate.
+    # bytes: only tokens are decoded (with replacement), any encoding is readable
+    try:
+        f = open(file, "rb")
+    except OSError:
+        return unreadable
+    with f:
+        try:
+            s = f.read(PREFIX_READ_SIZE)
+        except OSError:
+            return unreadable
+        if b"\0" in s:
+            return File(file, "UNKNOWN", set()), 0, "binary"
+        if lang is None:
+            tail = None
+            if len(s) == PREFIX_READ_SIZE:
+                try:
+                    # editors look for modelines in last lines of the whole file
+                    size = f.seek(0, os.SEEK_END)
+                    f.seek(max(len(s), size - TAIL_READ_SIZE))
+                    tail = f.read()
+                except OSError:
+                    return unreadable
+            lang, stage = polyglot.resolve(file, s, tail)
+        if lang is None:
+            stage = "tokenized"
+            try:
+                # chunks are read only while the language is ambiguous
+                prediction = polyglot.classify_file(f, margin, MAX_READ_SIZE, strategy)
+            except OSError:
+                return unreadable
+            lang, tokens = prediction.label, prediction.tokens
+        if lang in deps_of and len(s) == PREFIX_READ_SIZE:
+            try:
+                f.seek(len(s))
+                s += f.read(DEPS_READ_SIZE - len(s))
+            except OSError:
+                return unreadable
+    deps = set()
+    if lang in deps_of:
+        try:
+            deps = deps_of[lang](s.decode("utf-8", "replace"))
+        except Exception as e:
+            logging.error("parse {} error {}".format(file, e))
+    return File(file, lang, deps), tokens, stage
+
+
+def analyze_file(file: str, polyglot: 'Polyglot', margin: float = MARGIN, strategy: str = "head",
+                 known: Optional[Tuple[str, List[str]]] = None):
+    """
+    detect_file and blame of file
+    :param known: language and dependencies of file with the same content
+                  and name, nothing is read to detect them then
+    :return: File, lines per author, count of tokens used for detection
+             and resolution stage ("cached" if known)
+    """
+    from .gitlog import blame
+    if known is None:
+        fl, tokens, stage = detect_file(file, polyglot, margin, strategy)
+    else:
+        lang, deps = known
+        fl, tokens, stage = File(file, lang, set(deps)), 0, "cached"
+    return fl, dict(blame(file)), tokens, stage
+
+
+# classifiers of pool worker, attached to shared memory of the parent
+_worker = {}
+
+
+def _init_worker(models: Dict[str, 'SharedModel']):
+    from multiprocessing.util import Finalize
+    from .polyglot import Polyglot
+    from .gitlog import CommitMessageClassifier
+    classes = {"polyglot": Polyglot, "gitlog": CommitMessageClassifier}
+    for name, shared in models.items():
+        _worker[name] = classes[name].from_model(shared.attach())
+    # workers skip atexit, finalizers run when they exit after pool.close()
+    Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+    for classifier in _worker.values():
+        classifier.model.close()
+    _worker.clear()
+
+
+def _analyze_file_worker(args):
+    file, margin, strategy, known = args
+    return analyze_file(file, _worker["polyglot"], margin, strategy, known)
+
+
+def _classify_messages_worker(messages):
+    return _worker["gitlog"].classify_many(messages)
+
+
+def _memoized_gitlog(pool=None, cache: Optional['LRUCache'] = None) -> 'MemoizedClassifier':
+    from .gitlog import MemoizedClassifier
+    from .utils import LRUCache
+    if pool is None:
+        classify = get_gitlog().classify_many
+    else:
+        def classify(messages):
+            batches = pool.imap(_classify_messages_worker, chunks(messages, BATCH_SIZE))
+            return [label for labels in batches for label in labels]
+    return MemoizedClassifier(classify, cache if cache is not None else LRUCache(GITLOG_CACHE_SIZE))
+
+
+def _go_list_deps(path: str, results: Dict[str, File]):
+    """
+    imports of Go files resolved by toolchain: vendoring applied, one go
+    list for module. Files the host doesn't build (other GOOS, build tags)
+    keep their scanned imports
+    """
+    import shutil
+    from .deps import go_list_imports
+    if shutil.which("go") is None:
+        logging.warning("go list: go is not installed, imports are scanned")
+        return
+    try:
+        listed = go_list_imports(path)
+    except Exception as e:
+        logging.error("go list {} error {}".format(path, e))
+        return
+    for file, imports in listed.items():
+        fl = results.get(file)
+        if fl is not None and fl.lang == "golang":
+            fl.deps = imports
+    logging.info("go list: imports of {} files".format(len(listed)))
+
+
+def _analyze_files(items: List[Tuple[str, Optional[Tuple]]], polyglot: 'Polyglot', margin: float, strategy: str,
+                   pool=None):
+    """
+    analyze_file of (file, known) items, in pool if any
+    """
+    if pool is None:
+        return (analyze_file(file, polyglot, margin, strategy, known) for file, known in items)
+    return pool.imap(_analyze_file_worker, ((file, margin, strategy, known) for file, known in items), chunksize=16)
+
+
+def _cached_analysis(files: List[str], blobs: 'FileCache', polyglot: 'Polyglot', margin: float, strategy: str,
+                     pool=None):
+    """
+    analyze_file of files, language and dependencies of blobs in cache are
+    not detected again, nor of copies of a blob within files
+    """
+    from .cache import FileCache
+    keys = list(map(FileCache.key, files) if pool is None else pool.imap(FileCache.key, files, chunksize=64))
+    known = blobs.get_many(key for key in keys if key is not None)
+    # first copy of unknown blob is detected, others wait for it
+    detected, copies, seen, duplicates = [], [], set(known), 0
+    for file, key in zip(files, keys):
+        if key is not None and key in seen:
+            copies.append((file, key))
+            duplicates += key not in known
+            continue
+        detected.append((file, key))
+        if key is not None:
+            seen.add(key)
+    items = [(file, None) for file, _ in detected]
+    for (file, key), result in zip(detected, _analyze_files(items, polyglot, margin, strategy, pool)):
+        fl, _, _, stage = result
+        if key is not None and stage != "unreadable":
+            known[key] = fl.lang, sorted(fl.deps)
+            blobs.put(key, known[key])
+        yield result
+    # copies of a blob unreadable at its first copy are detected
+    yield from _analyze_files([(file, known.get(key)) for file, key in copies], polyglot, margin, strategy, pool)
+    blobs.flush()
+    logging.info("file cache: {}, {} copies of blobs detected once".format(blobs.stats(), duplicates))
+
+
+def analyze_module(module: 'Module', config: 'Config', margin: float = MARGIN, pool=None,
+                   gitlog_backend: str = "bayes", strategy: str = "head",
+                   memo: Optional['MemoizedClassifier'] = None, go_list: bool = False,
+                   index: Optional['ModuleIndex'] = None, blobs: Optional['FileCache'] = None):
+    from .deps import ModuleIndex
+    from .gitlog import extract_commits, History
+    polyglot = get_polyglot()
     path = (module.path != "." and os.path.join(BASE_DIR, module.path)) or BASE_DIR
     authors_aliases = {}
     for author in config.authors:
@@ -54,67 +330,61 @@ def analyze_module(module: Module, config: Config):
     results = {}
     lines = 0.0
     authors = defaultdict(lambda: 0.0)
-    for file in files:
-        logging.info("analyze {}".format(file))
-        with open(file, "r", encoding="utf-8") as f:
-            try:
-                s = f.read(MAX_READ_SIZE)
-            except:
-                results[file] = File(file, "UNKNOWN", set())
-                continue
-        for a, v in blame(file).items():
+    consumed, classified = 0, 0
+    stages = defaultdict(int)
+    if blobs is None:
+        analyzed = _analyze_files([(file, None) for file in files], polyglot, margin, strategy, pool)
+    else:
+        analyzed = _cached_analysis(list(files), blobs, polyglot, margin, strategy, pool)
+    for fl, blamed, tokens, stage in analyzed:
+        stages[stage] += 1
+        if tokens:
+            consumed += tokens
+            classified += 1
+        for a, v in blamed.items():
             authors[authors_aliases.get(a, a)] += v
             lines += v
-        ext = pathlib.Path(file).suffix
-        lang = polyglot.classify(s, ext)
-        deps = set()
-        if lang == "python":
-            try:
-                deps = get_python_deps(s)
-            except Exception as e:
-                logging.error("parse {} error {}".format(file, e))
-        if lang == 'js':
-            try:
-                deps = get_js_deps(s)
-            except Exception as e:
-                logging.error("parse {} error {}".format(file, e))
-        results[file] = File(file, lang, deps)
+        results[fl.path] = fl
+    if go_list and any(fl.lang == "golang" for fl in results.values()):
+        _go_list_deps(path, results)
+    logging.info("polyglot: {} files tokenized, {:.1f} tokens per file".format(
+        classified, classified and consumed / classified))
+    total = sum(stages.values())
+    logging.info("polyglot resolution: {}".format(", ".join(
+        "{} {:.1%}".format(stage, count / total) for stage, count in sorted(stages.items()))))
     stdout, _ = exec('git log --numstat --pretty=raw -- {}'.format(path), cwd=path)
 
-    features = defaultdict(lambda: 0.0)
-    author_feature = defaultdict(lambda: 0.0)
-    updates = 0.0
-
-    for commit in extract_commits(stdout):
-
-        feature = gitlog.classify(commit.message)
-        features[feature] += 1
-        author = authors_aliases.get(commit.author.name, commit.author.name)
-
-        for (insert, delete, filename) in commit.stats:
-            fl = results.get(os.path.join(BASE_DIR, filename))
-            if not fl:
-                continue
-            __updates = insert + delete
-            fl.updates += __updates
-            updates += __updates
-            author_feature[(author, feature)] += __updates
+    # history as columns, all commits classified at once
+    if gitlog_backend == "catboost":
+        # one predict call for all commits, catboost uses its own threads
+        commits = list(extract_commits(stdout))
+        history = History.from_commits(commits)
+        labels = get_catboost().classify_commits(commits)
+    else:
+        # commit messages repeat within and across modules: merges, version bumps, bots
+        memo = memo or _memoized_gitlog(pool)
+        history = History.from_log(stdout)
+        labels = memo.classify_many(history.messages)
+        logging.info("gitlog: {} of {} messages classified, hit rate {:.1%}, cache {}".format(
+            memo.classified, memo.messages, memo.hit_rate, memo.cache.stats()))
+    features = Counter(labels)
+    file_updates, author_feature = history.updates(
+        labels,
+        lambda name: authors_aliases.get(name, name),
+        lambda filename: os.path.join(BASE_DIR, filename) in results,
+    )
+    for filename, value in file_updates.items():
+        results[os.path.join(BASE_DIR, filename)].updates += value
+    updates = sum(file_updates.values())
 
     langs = defaultdict(lambda: 0.0)
     deps = defaultdict(lambda: 0.0)
+    if index is None:
+        index = ModuleIndex.build(BASE_DIR, config.ignore_list)
     for name, v in results.items():
         langs[v.lang] += v.updates
 
-        _deps = set()
-        if v.lang == 'python':
-            for d in v.deps:
-                local = os.path.join(os.path.dirname(name), d) + '.py'
-                glob = os.path.join(BASE_DIR, d) + '.py'
-                if results.get(local) or results.get(glob):
-                    continue
-                _deps.add(d)
-        else:
-            _deps = v.deps
+        _deps = [d for d in v.deps if not index.is_local(v.lang, d, name)]
         # TODO: JS DEPS invalid percents
         for d in _deps:
             deps[d] += v.updates / len(_deps)
@@ -148,10 +418,13 @@ def analyze_module(module: Module, config: Config):
     }
 
 
-def analyze(repo):
+def analyze(repo, margin: float = MARGIN, jobs: int = 1, gitlog_backend: str = "bayes", strategy: str = "head",
+            gitlog_cache: Optional[str] = None, go_list: bool = False, file_cache: Optional[str] = None):
     # I don't want the global variable, but...
     # TODO: fix this
     global BASE_DIR
+    from .config import Config, Module
+    from .deps import ModuleIndex
 
     BASE_DIR = os.path.abspath(repo)
     config = Config.from_file(os.path.join(BASE_DIR, DEFAULT_CONFIG_PATH))
@@ -165,14 +438,72 @@ def analyze(repo):
         "repository": config.repo,
         "modules": [],
     }
-    for module in modules:
-        r["modules"].append(analyze_module(module, config))
+    cache, fingerprint = None, ""
+    if gitlog_backend == "bayes":
+        from .utils import LRUCache
+        cache = LRUCache(GITLOG_CACHE_SIZE)
+        if gitlog_cache:
+            # classes of other model are stale
+            fingerprint = _file_digest(_model_path("classifier-gitlog.json"))
+            cache = LRUCache.load(gitlog_cache, GITLOG_CACHE_SIZE, fingerprint)
+    # local names of whole repo, modules import each other
+    index = ModuleIndex.build(BASE_DIR, config.ignore_list)
+    blobs = None
+    if file_cache:
+        from .cache import FileCache
+        blobs = FileCache(file_cache, _file_cache_version(margin, strategy), FILE_CACHE_SIZE)
+    try:
+        if jobs > 1:
+            from .shared import SharedModel, pool_context
+            models = {"polyglot": SharedModel.create(get_polyglot().model)}
+            if gitlog_backend == "bayes":
+                models["gitlog"] = SharedModel.create(get_gitlog().model)
+            try:
+                with pool_context().Pool(jobs, initializer=_init_worker, initargs=(models,)) as pool:
+                    memo = _memoized_gitlog(pool, cache) if cache is not None else None
+                    for module in modules:
+                        r["modules"].append(analyze_module(module, config, margin, pool, gitlog_backend, strategy,
+                                                           memo, go_list, index, blobs))
+                    # workers close shared memory on exit, terminate would kill them
+                    pool.close()
+                    pool.join()
+            finally:
+                for shared in models.values():
+                    shared.unlink()
+        else:
+            memo = _memoized_gitlog(cache=cache) if cache is not None else None
+            for module in modules:
+                r["modules"].append(analyze_module(module, config, margin, gitlog_backend=gitlog_backend,
+                                                  strategy=strategy, memo=memo, go_list=go_list, index=index,
+                                                  blobs=blobs))
+    finally:
+        if blobs is not None:
+            # rows of modules are flushed, only eviction is left
+            blobs.close()
+    if blobs is not None:
+        logging.info("file cache: {}".format(blobs.stats()))
+    if cache is not None and gitlog_cache:
+        cache.dump(gitlog_cache, fingerprint)
     print(json.dumps(r, indent=4, ensure_ascii=False))
 
 
 def main():
     parser = ArgumentParser(description="Help me, I don't know what i'm doing")
     parser.add_argument('--repo', default=".", dest="repo", help="Repository")
+    parser.add_argument('--margin', default=MARGIN, dest="margin", type=float,
+                        help="stop reading a file when best language wins by this log-probability gap")
+    parser.add_argument('--jobs', '-j', default=1, dest="jobs", type=int,
+                        help="worker processes, models are shared between them")
+    parser.add_argument('--gitlog-backend', default="bayes", dest="gitlog_backend", choices=GITLOG_BACKENDS,
+                        help="commit classifier: naive bayes or catboost (needs catboost and pandas)")
+    parser.add_argument('--read-strategy', default="head", dest="strategy", choices=READ_STRATEGIES,
+                        help="parts of large files to tokenize: head, head+tail or strided windows")
+    parser.add_argument('--gitlog-cache', default=None, dest="gitlog_cache",
+                        help="file to keep commit message classes between runs (bayes backend)")
+    parser.add_argument('--go-list', action="store_true", dest="go_list",
+                        help="resolve imports of Go files with one `go list` per module (needs go)")
+    parser.add_argument('--file-cache', default=None, dest="file_cache",
+                        help="sqlite file to keep languages and dependencies of files by content between runs")
     # list of commands
     subparsers = parser.add_subparsers(dest="cmd", help='List of commands')
 
@@ -184,6 +515,7 @@ def main():
         init(args.repo)
 
     if not args.cmd:
-        analyze(args.repo)
+        analyze(args.repo, args.margin, args.jobs, args.gitlog_backend, args.strategy, args.gitlog_cache,
+                args.go_list, args.file_cache)
 
 
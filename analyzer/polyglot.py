@@ -1,19 +1,28 @@
-from typing import Tuple, NewType, Awaitable, Callable
+from typing import Tuple, NewType, Awaitable, Callable, Sequence, Optional, List, Iterator, Iterable, Dict, TYPE_CHECKING
+import os
 from re import compile
-from .utils import extract, search, ExtractException, extract_pipeline
-from .classifier import Classifier
+from .utils import extract, search, ExtractException, extract_pipeline, scandir, Rule, Scanner
+from .classifier import Classifier, Prediction, MARGIN
+from .engines import NGramEngine
 import re
 
+if TYPE_CHECKING:
+    from .resolution import Resolved
+
 
 __all__ = (
     'Polyglot',
+    'NGramPolyglot',
 )
 
 
 MatchPosition = NewType("MatchPosition", Awaitable[Tuple])
 
 
-MAX_READ_SIZE = 2 ** 16
+# bytes of file tokenized at most, memory is bounded by CHUNK_SIZE anyway
+MAX_READ_SIZE = 2 ** 20
+CHUNK_SIZE = 2 ** 14
+READ_STRATEGIES = ("head", "head+tail", "strided")
 
 
 MULTI_LINE_COMMENTS = (
@@ -159,28 +168,229 @@ SGML_TAG_PIPELINE = (
 )
 
 
+def _shebang_token(s: str) -> str:
+    return 'SHEBANG#!{}'.format(parse_shebang(s))
+
+
+def _sgml_start_token(s: str) -> str:
+    return "{}>".format(s)
+
+
+# same steps as pipelines above, in one pass (see utils.Scanner)
+SGML_TAG_SCANNER = Scanner((
+    Rule(REGEX_EMIT_TRAILING, None, True),
+    Rule(REGEX_SINGLE_QUOTE, REGEX_SINGLE_END_QUOTE, None),
+    Rule(REGEX_DOUBLE_QUOTE, REGEX_DOUBLE_END_QUOTE, None),
+    Rule(REGEX_EMIT_WORD, None, True),
+))
+
+SGML_SCANNER = Scanner((
+    Rule(REGEX_SPACE, None, None),
+    Rule(REGEX_EMIT_START_TOKEN, None, _sgml_start_token),
+    Rule(REGEX_SGML_WORD, None, SGML_TAG_SCANNER),
+    Rule(REGEX_EMIT_WORD, None, True),
+))
+
+BASE_SCANNER = Scanner((
+    Rule(REGEX_SPACE, None, None),
+    Rule(REGEX_NUMBER_LITERALS, None, None),
+    Rule(REGEX_SHEBANG, None, _shebang_token),
+    Rule(REGEX_START_SINGLE_LINE_COMMENT, REGEX_BOL, None),
+    *(Rule(start, end, None) for start, end in MULTI_LINE_COMMENTS),
+    Rule(REGEX_SINGLE_QUOTE, REGEX_SINGLE_END_QUOTE, None),
+    Rule(REGEX_DOUBLE_QUOTE, REGEX_DOUBLE_END_QUOTE, None),
+    Rule(REGEX_PRIME_QUOTE, REGEX_PRIME_END_QUOTE, None),
+    Rule(REGEX_SGML, None, SGML_SCANNER),
+    *(Rule(r, None, True) for r in (REGEX_COMMON_PUNCTUATION, REGEX_REGULAR_TOKEN, REGEX_COMMON_OPERATORS)),
+))
+
+BYTES_SCANNER = BASE_SCANNER.tobytes("utf-8")
+
+REGEX_BYTES_SPACE = compile(rb'\s*')
+BYTES_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+def extract_bytes(s, lookup: Optional[Dict] = None) -> Iterator[str]:
+    """
+    tokenize UTF-8 bytes-like object (bytes, mmap) without decoding it,
+    only tokens are decoded. Same tokens as for decoded and stripped text
+    :param lookup: vocabulary of UTF-8 tokens, see Scanner.scan
+    """
+    start, end = REGEX_BYTES_SPACE.match(s).end(), len(s)
+    while end > start and s[end - 1] in BYTES_WHITESPACE:
+        end -= 1
+    if start and s[start:start + 2] == b"#!":
+        # shebang is matched at the beginning of input only
+        return BYTES_SCANNER.scan(bytes(s[start:end]), lookup=lookup)
+    return BYTES_SCANNER.scan(s, start, end, lookup)
+
+
+def read_windows(size: int, limit: int = MAX_READ_SIZE, strategy: str = "head",
+                 window: int = CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    byte ranges of file to tokenize
+    :param size: file size
+    :param limit: bytes to read at most
+    :param strategy: head; head+tail - halves of limit from both ends;
+                     strided - windows spread evenly over file
+    :return: list of (start, end)
+    """
+    if size <= limit:
+        return [(0, size)]
+    if strategy == "head":
+        return [(0, limit)]
+    if strategy == "head+tail":
+        half = limit // 2
+        return [(0, half), (size - (limit - half), size)]
+    if strategy == "strided":
+        count = max(2, limit // window)
+        stride = (size - window) // (count - 1)
+        return [(i * stride, i * stride + window) for i in range(count)]
+    raise ValueError("unknown read strategy {}".format(strategy))
+
+
+def _read_range(f, start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+    f.seek(start)
+    while start < end:
+        piece = f.read(min(chunk_size, end - start))
+        if not piece:
+            break
+        start += len(piece)
+        yield piece
+
+
+def _range_reader(f, start: int, end: int, chunk_size: int) -> Callable[[int], Iterator[bytes]]:
+    return lambda offset: _read_range(f, start + offset, end, chunk_size)
+
+
+def extract_file(f, limit: int = MAX_READ_SIZE, strategy: str = "head",
+                 chunk_size: int = CHUNK_SIZE, lookup: Optional[Dict] = None) -> Iterator[str]:
+    """
+    tokenize file by chunks, memory doesn't depend on file size or limit.
+    Within a window tokens are the same as of extract_bytes, except for
+    tokens longer than Scanner.stream guard
+    :param f: file opened in binary mode
+    :param lookup: see extract_bytes
+    """
+    size = os.fstat(f.fileno()).st_size
+    for start, end in read_windows(size, limit, strategy, chunk_size):
+        if start == 0:
+            pos = 0
+            for piece in _read_range(f, 0, end, chunk_size):
+                space = REGEX_BYTES_SPACE.match(piece).end()
+                pos += space
+                if space < len(piece):
+                    break
+            if pos and b"".join(_read_range(f, pos, min(end, pos + 2), 2)) == b"#!":
+                # shebang is matched at the beginning of input only
+                start, pos = pos, 0
+        else:
+            # a byte before window keeps `^` from matching inside file
+            start, pos = start - 1, 1
+        yield from BYTES_SCANNER.stream(_range_reader(f, start, end, chunk_size), pos=pos, lookup=lookup)
+
+
 class Polyglot(Classifier):
 
-    MAP = {
-        ".js": "js",
-        ".py": "python",
-        ".html": "html",
-        ".go": "golang",
-        ".css": "css",
-        ".pyc": "py",
-        # TODO: continue ...
+    # resolved languages the model knows as a class of their family
+    DIALECTS = {
+        "typescript": "js",
+        "scss": "css",
+        "less": "css",
     }
 
-    MAX_READ_SIZE = 1048576
-
     @staticmethod
     def extract(s: str):
+        if not isinstance(s, str):
+            return extract_bytes(s)
         s = s.strip()
-        return extract_pipeline(BASE_PIPELINE, s)
+        return BASE_SCANNER.scan(s)
+
+    def resolve(self, path: str, s: Optional[str] = None, tail: Optional[str] = None) -> 'Resolved':
+        """
+        language by filename, extension, shebang or modeline, without tokenization.
+        Dialects are labeled as the model's class of their family
+        :param s: head of file, only name is used without it
+        :param tail: end of file for modelines, see Resolution.by_content
+        :return: label and stage of resolution, (None, None) if ambiguous
+        """
+        from .resolution import load_resolution, Resolved, UNRESOLVED
+        resolution = load_resolution()
+        resolved = resolution.by_name(path)
+        if resolved.label is None and s is not None:
+            resolved = resolution.by_content(s, tail)
+        if resolved.label is None:
+            return UNRESOLVED
+        return Resolved(self._model_class(resolved.label), resolved.stage)
+
+    def _model_class(self, label: Optional[str]) -> Optional[str]:
+        return self.DIALECTS.get(label, label)
+
+    def _extension_class(self, ext: str) -> Optional[str]:
+        from .resolution import load_resolution
+        return self._model_class(load_resolution().extension(ext)) if ext else None
+
+    def classify_file(self, f, margin: float = MARGIN, limit: int = MAX_READ_SIZE,
+                      strategy: str = "head") -> Prediction:
+        """
+        classify file reading chunks only while the result is ambiguous
+        :param f: file opened in binary mode
+        :param strategy: see read_windows
+        """
+        lookup = self.ENGINE.lookup(self.model, "utf-8")
+        if lookup is None:
+            return self.model.stream(self.ENGINE.features(extract_file(f, limit, strategy)), margin)
+        return self.model.stream_ids(extract_file(f, limit, strategy, lookup=lookup), margin)
+
+    def ids(self, s: str) -> Iterable[Optional[int]]:
+        """
+        rows straight from the scanner when features are tokens, so
+        tokens of bytes input are never decoded
+        """
+        lookup = self.ENGINE.lookup(self.model, None if isinstance(s, str) else "utf-8")
+        if lookup is None:
+            return super(Polyglot, self).ids(s)
+        if isinstance(s, str):
+            return BASE_SCANNER.scan(s.strip(), lookup=lookup)
+        return extract_bytes(s, lookup)
+
+    def unambiguous_samples(self, path: str, ignore_list=()) -> Iterator[Tuple[str, str]]:
+        """
+        label files of repo by extension to update the model
+        :param path: repo dir
+        :param ignore_list: list of compiled regex
+        :return: pairs of document and class
+        """
+        for fp in scandir(path, list(ignore_list)):
+            label = self.resolve(fp).label
+            if label not in self.classes:
+                continue
+            try:
+                with open(fp, "r", encoding="utf-8") as f:
+                    yield f.read(MAX_READ_SIZE), label
+            except UnicodeDecodeError:
+                continue
+
+    def classify_stream(self, s: str, guess_class: str = "", margin: float = MARGIN) -> Prediction:
+        label = self._extension_class(guess_class)
+        if label is not None:
+            return Prediction(label, 0, True)
+        return super(Polyglot, self).classify_stream(s, guess_class, margin)
+
+    def classify_many(self, documents: Sequence[str], guess_classes: Optional[Sequence[str]] = None) -> List[str]:
+        # TODO: fix this ...
+        guess_classes = guess_classes or [""] * len(documents)
+        result = [self._extension_class(guess_class) for guess_class in guess_classes]
+        unknown = [i for i, r in enumerate(result) if r is None]
+        labels = super(Polyglot, self).classify_many([documents[i] for i in unknown])
+        for i, label in zip(unknown, labels):
+            result[i] = label
+        return result
 
 
-    def classify(self, s: str, guess_class: str = "") ->  str:
-        # TODO: fix this ...
-        if guess_class in self.MAP:
-            return self.MAP[guess_class]
-        return super(Polyglot, self).classify(s, guess_class)
\ No newline at end of file
+class NGramPolyglot(Polyglot):
+    """
+    Polyglot over hashed character n-grams of tokens, constant memory
+    """
+
+    ENGINE = NGramEngine()
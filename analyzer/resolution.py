@@ -0,0 +1,128 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+from .polyglot import parse_shebang
+
+
+__all__ = [
+    'Resolution',
+    'Resolved',
+    'UNRESOLVED',
+    'load_resolution',
+]
+
+
+RESOLUTION_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), "polyglot-resolution.json")
+
+# stages of the cascade, in order; files left ambiguous are tokenized
+STAGES = ("filename", "extension", "shebang", "modeline")
+
+# editors look for modelines in first and last lines only
+MODELINE_LINES = 5
+
+REGEX_EMACS_MODELINE = re.compile(r"-\*-\s*(?:.*?\bmode:\s*)?([\w+\-]+)\s*(?:;[^\n]*?)?-\*-", re.IGNORECASE)
+REGEX_VIM_MODELINE = re.compile(r"\b(?:vim?|ex):[^\n]*?\b(?:ft|filetype|syntax)=([\w+\-]+)")
+REGEX_INTERPRETER_VERSION = re.compile(r"[\d.]+$")
+
+
+Resolved = NamedTuple("Resolved", (
+    ("label", Optional[str]),
+    ("stage", Optional[str]),
+))
+
+UNRESOLVED = Resolved(None, None)
+
+
+class Resolution:
+    """
+    language of file by exact filename, extension, shebang interpreter and
+    editor modeline, see polyglot-resolution.json. Extensions mapped to
+    null are ambiguous and fall through to the next stages
+    """
+
+    def __init__(self, filenames: Dict[str, str], extensions: Dict[str, Optional[str]],
+                 interpreters: Dict[str, str], modelines: Dict[str, str]):
+        self.filenames = filenames
+        self.extensions = extensions
+        self.interpreters = interpreters
+        self.modelines = modelines
+
+    @classmethod
+    def load(cls, fp: str) -> 'Resolution':
+        with open(fp, "r") as f:
+            return cls(**json.load(f))
+
+    def extension(self, ext: str) -> Optional[str]:
+        return self.extensions.get(ext.lower())
+
+    def by_name(self, path: str) -> Resolved:
+        """
+        resolve without reading the file
+        """
+        name = os.path.basename(path)
+        label = self.filenames.get(name)
+        if label is not None:
+            return Resolved(label, "filename")
+        label = self.extension(os.path.splitext(name)[1])
+        if label is not None:
+            return Resolved(label, "extension")
+        return UNRESOLVED
+
+    def by_content(self, s: str, tail: Optional[str] = None) -> Resolved:
+        """
+        :param s: head of file, str or UTF-8 bytes
+        :param tail: end of file for modelines of last lines, head is the
+                     whole file without it
+        """
+        if not isinstance(s, str):
+            s = bytes(s).decode("utf-8", "replace")
+        if tail is None:
+            tail = s
+        elif not isinstance(tail, str):
+            tail = bytes(tail).decode("utf-8", "replace")
+        if s.startswith("#!"):
+            label = self.interpreter(s[:s.find("\n")] if "\n" in s else s)
+            if label is not None:
+                return Resolved(label, "shebang")
+        lines = s.split("\n", MODELINE_LINES)[:MODELINE_LINES]
+        lines.extend(tail.rsplit("\n", MODELINE_LINES)[-MODELINE_LINES:])
+        for line in lines:
+            label = self.modeline(line)
+            if label is not None:
+                return Resolved(label, "modeline")
+        return UNRESOLVED
+
+    def resolve(self, path: str, s: Optional[str] = None, tail: Optional[str] = None) -> Resolved:
+        """
+        :param s: head of file, content stages are skipped without it
+        :param tail: see by_content
+        """
+        resolved = self.by_name(path)
+        if resolved.label is None and s is not None:
+            return self.by_content(s, tail)
+        return resolved
+
+    def interpreter(self, line: str) -> Optional[str]:
+        # parse_shebang handles `env`, but returns arguments of `#!/bin/sh -e`
+        program = line[2:].split()[0] if line[2:].split() else ""
+        for name in (parse_shebang(line), os.path.basename(program)):
+            name = REGEX_INTERPRETER_VERSION.sub("", name)
+            if name in self.interpreters:
+                return self.interpreters[name]
+        return None
+
+    def modeline(self, line: str) -> Optional[str]:
+        for regex in (REGEX_EMACS_MODELINE, REGEX_VIM_MODELINE):
+            match = regex.search(line)
+            if match:
+                label = self.modelines.get(match.group(1).lower())
+                if label is not None:
+                    return label
+        return None
+
+
+@lru_cache(maxsize=None)
+def load_resolution(fp: str = RESOLUTION_PATH) -> Resolution:
+    return Resolution.load(fp)
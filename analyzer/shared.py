@@ -0,0 +1,70 @@
+from multiprocessing import shared_memory, get_context, get_all_start_methods
+from .classifier import Model
+
+
+__all__ = [
+    'SharedModel',
+    'pool_context',
+]
+
+
+PRELOAD = [
+    "analyzer.main",
+    "analyzer.polyglot",
+    "analyzer.gitlog",
+    "analyzer.deps",
+]
+
+
+class SharedModel:
+    """
+    compiled model in shared memory, created by the parent process;
+    workers attach read-only by name instead of loading the model again
+    """
+
+    def __init__(self, name: str, size: int, model_cls=Model):
+        self.name = name
+        self.size = size
+        self.model_cls = model_cls
+        self._shm = None
+
+    @classmethod
+    def create(cls, model: Model) -> 'SharedModel':
+        data = model.tobytes()
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        shm.buf[:len(data)] = data
+        shared = cls(shm.name, len(data), type(model))
+        shared._shm = shm
+        return shared
+
+    def attach(self) -> Model:
+        shm = shared_memory.SharedMemory(name=self.name)
+        model = self.model_cls.frombuffer(shm.buf[:self.size].toreadonly())
+        # memory must outlive the model
+        model.buffer = shm
+        return model
+
+    def unlink(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __getstate__(self):
+        return self.name, self.size, self.model_cls
+
+    def __setstate__(self, state):
+        self.name, self.size, self.model_cls = state
+        self._shm = None
+
+
+def pool_context():
+    """
+    forkserver with preloaded analyzer modules: workers are forked from
+    a process that already imported them, so pools start in milliseconds
+    """
+    if "forkserver" not in get_all_start_methods():
+        return get_context()
+    ctx = get_context("forkserver")
+    ctx.set_forkserver_preload(PRELOAD)
+    return ctx
@@ -1,7 +1,10 @@
 import re
 import os
+import json
 import subprocess
-from typing import Iterable, List
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Union, Callable, Dict
 
 
 __all__ = [
@@ -9,8 +12,13 @@ __all__ = [
     'extract',
     'int_or_zero',
     'extract_pipeline',
+    'Rule',
+    'Scanner',
+    'trie_pattern',
     'exec',
     'scandir',
+    'chunks',
+    'LRUCache',
 ]
 
 
@@ -75,7 +83,7 @@ def extract_pipeline(pipeline: Iterable, s: str, pos: int=0):
                 q = [res, ]
                 while len(q) > 0:
                     node = q.pop(0)
-                    if hasattr(node, "__aiter__"):
+                    if hasattr(node, "__next__"):
                         for child in node:
                             q.append(child)
                     else:
@@ -86,6 +94,258 @@ def extract_pipeline(pipeline: Iterable, s: str, pos: int=0):
         else:
             pos += 1
 
+Rule = NamedTuple("Rule", (
+    ("regex", 're.__Regex'),
+    # closing delimiter: everything up to it is skipped, rule fails if not found
+    ("end", Optional['re.__Regex']),
+    # None - skip match, True - emit match, callable - emit its result,
+    # Scanner - emit tokens of the match scanned with it
+    ("emit", Union[None, bool, Callable[[str], str], 'Scanner']),
+))
+
+
+class Scanner:
+    """
+    single pass equivalent of extract_pipeline: rules are alternatives of
+    one regex tried in order, so a position costs one match instead of
+    an exception per failed step. When closing delimiter of a rule isn't
+    found, the same position is matched against the rules after it.
+
+    Scanning is linear if rules are: a failed search for a delimiter is
+    remembered, so unterminated strings or comments don't rescan the rest
+    of input at every opening delimiter
+    """
+
+    def __init__(self, rules: Sequence[Rule], encoding: Optional[str] = None):
+        """
+        :param encoding: rules are bytes regexes, emitted tokens are decoded
+        """
+        self.rules = tuple(rules)
+        self.encoding = encoding
+        # tails[i] - alternatives of rules[i:], group index -> rule index
+        self.tails = [self._compile(i) for i in range(len(self.rules))]
+
+    def _compile(self, start: int):
+        alternatives, groups, index = [], 1, {}
+        for i, rule in enumerate(self.rules[start:], start):
+            alternatives.append(_scoped_pattern(rule.regex))
+            index[groups] = i
+            groups += rule.regex.groups + 1
+        if isinstance(alternatives[0], bytes):
+            pattern = b"|".join(b"(" + alternative + b")" for alternative in alternatives)
+        else:
+            pattern = "|".join("({})".format(alternative) for alternative in alternatives)
+        return re.compile(pattern).match, index
+
+    def tobytes(self, encoding: str = "utf-8") -> 'Scanner':
+        """
+        same scanner over encoded input (bytes, mmap), see _bytes_regex
+        """
+        return Scanner([
+            Rule(
+                _bytes_regex(rule.regex),
+                rule.end and _bytes_regex(rule.end),
+                rule.emit.tobytes(encoding) if isinstance(rule.emit, Scanner) else rule.emit,
+            )
+            for rule in self.rules
+        ], encoding)
+
+    def scan(self, s: str, pos: int = 0, endpos: Optional[int] = None,
+             lookup: Optional[Dict] = None) -> Iterator[str]:
+        """
+        :param s: source string, bytes-like object for bytes scanner
+        :param pos: start position
+        :param endpos: end position, as for regex
+        :param lookup: vocabulary, token (encoded for bytes scanner) -> id:
+                       ids are emitted instead of tokens, None for unknown
+                       tokens, so tokens aren't decoded
+        :return: tokens
+        """
+        endpos = len(s) if endpos is None else endpos
+        return self._scan(s, pos, endpos, endpos, [pos, None], lookup=lookup)
+
+    def stream(self, read: Callable[[int], Iterable], guard: int = 2 ** 10, pos: int = 0,
+               lookup: Optional[Dict] = None) -> Iterator[str]:
+        """
+        scan input given by consecutive pieces keeping at most a piece and
+        `guard` characters before it in memory. Tokens starting in the
+        last `guard` characters of a piece wait for the next one. The end
+        of a comment or string open at the end of a piece is searched in
+        next pieces without keeping them; if input ends first, it's read
+        again from the opening delimiter, which fails as for scan.
+        Unlike scan, tokens longer than guard may be split
+        :param read: offset -> consecutive pieces of input from offset
+        :param pos: start position in input
+        :param lookup: see scan
+        """
+        # end regex -> position after which it isn't found, as in _scan
+        failed = {}
+        base, pieces = 0, iter(read(0))
+        buf, opened = next(pieces, None), None
+        while buf is not None:
+            piece = next(pieces, None)
+            final = piece is None
+            if opened is not None:
+                opening, end, start = opened
+                m = end.search(buf, start - base)
+                if m is not None and (final or m.end() < len(buf)):
+                    opened, pos = None, m.end()
+                elif final:
+                    failed[end] = start
+                    # a character before delimiter, as kept below
+                    keep = min(opening, 1)
+                    base, pos, opened = opening - keep, keep, None
+                    pieces = iter(read(base))
+                    buf = next(pieces, None)
+                    continue
+            if opened is None:
+                state = [pos, None]
+                limit = len(buf) if final else len(buf) - guard
+                yield from self._scan(buf, pos, len(buf), limit, state, base, failed, lookup)
+                pos, opened = state
+            if final:
+                break
+            if opened is None:
+                # keep a character before resume position: context of
+                # lookbehinds, and `^` must not match inside the input
+                keep = max(0, pos - 1)
+                pos -= keep
+            else:
+                # end delimiter may start in this piece
+                keep = max(opened[2] - base, len(buf) - guard)
+            base += keep
+            buf = buf[keep:] + piece
+
+    def _scan(self, s, pos: int, endpos: int, limit: int, state: list, base: int = 0,
+              failed: Optional[Dict] = None, lookup: Optional[Dict] = None) -> Iterator[str]:
+        """
+        scan from pos, start tokens before limit only; if limit < endpos
+        more input follows: the scan stops at a delimiter without its end
+        in s
+        :param state: position to resume from and, if the scan stopped at
+                      a delimiter, its position, end regex and position
+                      after it, updated. Positions in state and failed
+                      are of input where s starts at base
+        :param failed: end regex -> position after which it isn't found
+        """
+        rules, tails, encoding = self.rules, self.tails, self.encoding
+        final = limit == endpos
+        failed = {} if failed is None else failed
+        while pos < limit:
+            match, index = tails[0]
+            while True:
+                m = match(s, pos, endpos)
+                if m is None:
+                    pos += 1
+                    break
+                i = index[m.lastindex]
+                _, end, emit = rules[i]
+                if end is not None:
+                    start = m.end()
+                    if start + base >= failed.get(end, base + endpos + 1):
+                        m = None
+                    else:
+                        m = end.search(s, start, endpos)
+                        if not final and (m is None or m.end() == endpos):
+                            # end is in input after s, if anywhere
+                            state[0], state[1] = pos, (base + pos, end, base + start)
+                            return
+                        if m is None:
+                            failed[end] = base + start
+                    if m is None:
+                        if i + 1 == len(rules):
+                            pos += 1
+                            break
+                        match, index = tails[i + 1]
+                        continue
+                    pos = m.end()
+                    break
+                pos = m.end()
+                if emit is None:
+                    break
+                if isinstance(emit, Scanner):
+                    yield from emit.scan(s, m.start(), pos, lookup)
+                    break
+                token = m.group()
+                if lookup is not None and emit is True:
+                    yield lookup.get(token)
+                    break
+                if encoding is not None:
+                    token = token.decode(encoding, "replace")
+                if emit is not True:
+                    token = emit(token)
+                if lookup is not None:
+                    token = lookup.get(token if encoding is None else token.encode(encoding))
+                yield token
+                break
+        state[0] = pos
+
+
+# flags which keep their meaning inside an alternation as (?flags:...)
+SCOPED_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.VERBOSE, "x"))
+
+
+def _scoped_pattern(regex: 're.__Regex'):
+    """
+    pattern of regex with its flags inline, to be an alternative of other regex
+    """
+    flags = "".join(flag for value, flag in SCOPED_FLAGS if regex.flags & value)
+    if not flags:
+        return regex.pattern
+    if isinstance(regex.pattern, bytes):
+        return b"(?" + flags.encode("ascii") + b":" + regex.pattern + b")"
+    return "(?{}:{})".format(flags, regex.pattern)
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    alternation of words with common prefixes merged, as in a trie:
+    ("doc", "docs", "test") -> (?:doc(?:s)?|test)
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for c in word:
+            node = node.setdefault(c, {})
+        node[""] = {}
+
+    def pattern(node: dict) -> str:
+        branches = [re.escape(c) + pattern(child) for c, child in sorted(node.items()) if c]
+        if not branches:
+            return ""
+        if "" in node:
+            return "(?:{})?".format("|".join(branches))
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:{})".format("|".join(branches))
+
+    return pattern(trie)
+
+
+def _bytes_regex(regex: 're.__Regex') -> 're.__Regex':
+    """
+    bytes regex for UTF-8 input equivalent to str one: \\w also matches
+    non-ASCII bytes, so words in any script stay whole
+    """
+    pattern, out, in_class, i = regex.pattern, [], False, 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            escape = pattern[i:i + 2]
+            if escape == r"\w":
+                escape = r"\w\x80-\xff" if in_class else r"[\w\x80-\xff]"
+            out.append(escape)
+            i += 2
+            continue
+        if c == "[" and not in_class:
+            in_class = True
+        elif c == "]" and in_class:
+            in_class = False
+        out.append(c)
+        i += 1
+    return re.compile("".join(out).encode("ascii"), regex.flags & ~re.UNICODE)
+
+
 def exec(cmd: str, cwd: str =".") -> (str, str):
 
     """
@@ -112,4 +372,82 @@ def scandir(dir: str, ingore_list: List['re.__Regex'] = list()):
         if os.path.isdir(f):
             files.extend([os.path.join(f, c) for c in os.listdir(f)])
             continue
-        yield f
\ No newline at end of file
+        yield f
+
+def chunks(iterable: Iterable, size: int) -> Iterator[List]:
+    """
+    split iterable to lists of `size` items
+    :param iterable: source
+    :param size: max size of chunk
+    """
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+class LRUCache:
+    """
+    bounded mapping dropping least recently used items, counts hits and
+    misses. Can be saved to JSON: a file with other fingerprint (e.g.
+    of other model) is ignored on load
+    """
+
+    def __init__(self, maxsize: int = 2 ** 16):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        try:
+            value = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return total and self.hits / total
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    @classmethod
+    def load(cls, fp: str, maxsize: int = 2 ** 16, fingerprint: str = "") -> 'LRUCache':
+        cache = cls(maxsize)
+        if not os.path.exists(fp):
+            return cache
+        with open(fp, "r") as f:
+            data = json.load(f)
+        if data.get("fingerprint") == fingerprint:
+            for key, value in data["items"][-maxsize:]:
+                cache.items[key] = value
+        return cache
+
+    def dump(self, fp: str, fingerprint: str = ""):
+        # least recently used first, as load expects
+        tmp = fp + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"fingerprint": fingerprint, "items": list(self.items.items())}, f)
+        os.replace(tmp, fp)
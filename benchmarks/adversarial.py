@@ -0,0 +1,66 @@
+"""
+linear-time check of Polyglot tokenizer on pathological inputs
+
+    python -m benchmarks.adversarial
+
+every input is tokenized at two sizes; time should grow with size, not
+with its square. Fails if ratio of times exceeds ratio of sizes times SLACK
+"""
+from argparse import ArgumentParser
+import sys
+import time
+from analyzer.polyglot import Polyglot
+
+
+SLACK = 2.5
+
+CASES = {
+    "unterminated double quotes": lambda n: 'a "b ' * n,
+    "unterminated single quotes": lambda n: "a 'b " * n,
+    "unterminated template": lambda n: "a `b " * n,
+    "unterminated block comments": lambda n: "a /* b " * n,
+    "unterminated docstrings": lambda n: 'a """ b ' * n,
+    "unterminated html comments": lambda n: "a <!-- b " * n,
+    "backslash run": lambda n: '"' + "\\" * (5 * n),
+    "escaped quotes": lambda n: '"' + '\\"' * (3 * n),
+    "huge single line": lambda n: "x = y + z; " * n,
+    "huge line comment": lambda n: "// " + "x y " * n,
+    "deep sgml": lambda n: "<a b=" * n + ">" * n,
+    "open sgml": lambda n: "<a b c " * n,
+    "long word": lambda n: "x" * (5 * n),
+    "long number": lambda n: "1." * (3 * n),
+}
+
+
+def elapsed(s: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in Polyglot.extract(s):
+            pass
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = ArgumentParser(description="tokenizer scaling on adversarial inputs")
+    parser.add_argument("--size", type=int, default=2 ** 12, help="base repeat count of pattern")
+    parser.add_argument("--factor", type=int, default=8, help="size ratio of the two runs")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+
+    failed = False
+    limit = args.factor * SLACK
+    for name, make in CASES.items():
+        small, large = make(args.size), make(args.size * args.factor)
+        t_small, t_large = elapsed(small, args.repeat), elapsed(large, args.repeat)
+        ratio = t_large / max(t_small, 1e-9)
+        ok = ratio <= limit
+        failed = failed or not ok
+        print("{:<28} {:>9} chars {:9.1f} ms  x{:<6.1f} {}".format(
+            name, len(large), t_large * 1000, ratio, "ok" if ok else "FAIL (limit x{})".format(limit)))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+commit history features: Commit objects and per row updates vs columns
+
+    python -m benchmarks.commit_history --commits 100000
+
+builds a synthetic `git log --numstat --pretty=raw` output and computes
+updated lines per file and per (author, class) as analyze_module did
+before (extract_commits, then a dict update per numstat row) and with
+gitlog.History (columns straight from the log, grouped sums). Checks both
+agree and reports time of parsing and of the feature section of each
+"""
+from argparse import ArgumentParser
+from collections import defaultdict
+import json
+import os
+import random
+import sys
+import time
+from analyzer.gitlog import History, extract_commits
+
+
+LABELS = ("bug", "docs", "feature", "refactor", "test", "version")
+BASE_DIR = "/repo"
+
+
+def synthetic_log(commits: int, files: int = 3000, authors: int = 60, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    paths = ["src/pkg{}/module{}.py".format(i % 40, i) for i in range(files)]
+    out = []
+    for i in range(commits):
+        author = "author{}".format(rnd.randrange(authors))
+        out.append(
+            "commit {0:040x}\ntree {0:040x}\nparent {1:040x}\n"
+            "author {2} <{2}@example.org> 1600000000 +0000\n"
+            "committer {2} <{2}@example.org> 1600000000 +0000\n\n"
+            "    update module {0}\n\n".format(i, i + 1, author)
+        )
+        for _ in range(rnd.randint(1, 8)):
+            # removed files aren't in the tree anymore
+            path = rnd.choice(paths) if rnd.random() < 0.9 else "removed/file{}.c".format(rnd.randrange(500))
+            insert, delete = ("-", "-") if rnd.random() < 0.02 else (rnd.randint(0, 50), rnd.randint(0, 30))
+            out.append("{}\t{}\t{}\n".format(insert, delete, path))
+        out.append("\n")
+    return "".join(out)
+
+
+def per_row(commits, labels, known, aliases):
+    """
+    feature section of analyze_module before columns
+    """
+    file_updates = defaultdict(lambda: 0)
+    author_feature = defaultdict(lambda: 0.0)
+    for commit, feature in zip(commits, labels):
+        author = aliases.get(commit.author.name, commit.author.name)
+        for (insert, delete, filename) in commit.stats:
+            path = os.path.join(BASE_DIR, filename)
+            if path not in known:
+                continue
+            file_updates[path] += insert + delete
+            author_feature[(author, feature)] += insert + delete
+    return dict(file_updates), dict(author_feature)
+
+
+def columns(history, labels, known, aliases):
+    file_updates, author_feature = history.updates(
+        labels,
+        lambda name: aliases.get(name, name),
+        lambda filename: os.path.join(BASE_DIR, filename) in known,
+    )
+    return {os.path.join(BASE_DIR, filename): value for filename, value in file_updates.items()}, author_feature
+
+
+def elapsed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description="benchmark commit history features")
+    parser.add_argument("--commits", type=int, default=10 ** 5, help="commits in synthetic history")
+    parser.add_argument("--seed", type=int, default=0, help="history seed")
+    args = parser.parse_args()
+
+    log = synthetic_log(args.commits, seed=args.seed)
+    rnd = random.Random(args.seed)
+    labels = [rnd.choice(LABELS) for _ in range(args.commits)]
+    known = {os.path.join(BASE_DIR, "src/pkg{}/module{}.py".format(i % 40, i)) for i in range(3000)}
+    aliases = {"author1": "author0"}
+
+    commits, parse_rows = elapsed(lambda: list(extract_commits(log)))
+    history, parse_columns = elapsed(History.from_log, log)
+    (files_rows, authors_rows), features_rows = elapsed(per_row, commits, labels, known, aliases)
+    (files_columns, authors_columns), features_columns = elapsed(columns, history, labels, known, aliases)
+    if files_rows != files_columns or list(authors_rows.items()) != list(authors_columns.items()):
+        print("updates differ", file=sys.stderr)
+        sys.exit(1)
+
+    report = {
+        "commits": len(history),
+        "numstat_rows": len(history.stat_updates),
+        "rows": {
+            "parse_ms": round(parse_rows * 1000, 1),
+            "features_ms": round(features_rows * 1000, 1),
+        },
+        "columns": {
+            "parse_ms": round(parse_columns * 1000, 1),
+            "features_ms": round(features_columns * 1000, 1),
+        },
+        "speedup": {
+            "parse": round(parse_rows / parse_columns, 2),
+            "features": round(features_rows / features_columns, 2),
+            "total": round((parse_rows + features_rows) / (parse_columns + features_columns), 2),
+        },
+    }
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
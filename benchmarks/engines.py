@@ -0,0 +1,56 @@
+"""
+token engine vs hashed character n-gram engine of Polyglot
+
+    python -m benchmarks.engines --samples analyzer/polyglot-samples
+
+both are trained on the same stratified split of samples and measured on
+held-out files: accuracy, model size, load time, scoring throughput over
+pre-computed features and end-to-end throughput (tokenize + features + score)
+"""
+from argparse import ArgumentParser
+import json
+import time
+from analyzer.polyglot import Polyglot, NGramPolyglot
+from analyzer.evaluation import holdout_split, read_samples, measure
+
+
+ENGINES = {
+    "token": Polyglot,
+    "ngram": NGramPolyglot,
+}
+
+
+def end_to_end(classifier, files):
+    docs = []
+    for fp, _ in files:
+        with open(fp, "r") as f:
+            docs.append(f.read())
+    size = sum(len(doc) for doc in docs)
+    start = time.perf_counter()
+    classifier.classify_many(docs)
+    elapsed = time.perf_counter() - start
+    return {
+        "docs_per_sec": round(len(docs) / elapsed, 2),
+        "kb_per_sec": round(size / 1024 / elapsed, 1),
+    }
+
+
+def main():
+    parser = ArgumentParser(description="benchmark Polyglot engines")
+    parser.add_argument("--samples", default="analyzer/polyglot-samples", help="labeled samples dir")
+    parser.add_argument("--holdout", type=float, default=0.34, help="held-out fraction")
+    args = parser.parse_args()
+
+    train, test = holdout_split(list(Polyglot.sample_files(args.samples)), args.holdout)
+    report = {}
+    for name, classifier_cls in ENGINES.items():
+        classifier = classifier_cls.from_counts(classifier_cls.count_files(train))
+        report[name] = dict(
+            measure(classifier, read_samples(test)),
+            end_to_end=end_to_end(classifier, test),
+        )
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+file cache: detect_file of every file vs results by blob in sqlite
+
+    python -m benchmarks.file_cache --root /usr/lib/node_modules/npm
+
+detects language and dependencies of every file under root with
+main.detect_file, then through cache.FileCache as analyze_module does:
+cold (empty cache, copies of a blob within root detected once) and warm
+(second run, every blob known). Blame is left out, it runs for every file
+either way. Checks all agree and reports time of each and cache stats
+"""
+from argparse import ArgumentParser
+import json
+import os
+import sys
+import tempfile
+import time
+from analyzer.cache import FileCache
+from analyzer.classifier import MARGIN
+from analyzer.main import detect_file, get_polyglot, _file_cache_version
+from analyzer.utils import scandir
+
+
+def detect_all(files, polyglot):
+    r = {}
+    for file in files:
+        fl, _, _ = detect_file(file, polyglot)
+        r[file] = fl.lang, sorted(fl.deps)
+    return r
+
+
+def detect_cached(files, polyglot, blobs: FileCache):
+    keys = [FileCache.key(file) for file in files]
+    known = blobs.get_many(key for key in keys if key is not None)
+    r = {}
+    for file, key in zip(files, keys):
+        if key is None or key not in known:
+            fl, _, stage = detect_file(file, polyglot)
+            r[file] = fl.lang, sorted(fl.deps)
+            if key is not None and stage != "unreadable":
+                known[key] = r[file]
+                blobs.put(key, r[file])
+            continue
+        r[file] = tuple(known[key])
+    blobs.flush()
+    return r
+
+
+def elapsed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description="benchmark file cache")
+    parser.add_argument("--root", default="analyzer", help="dir with files")
+    args = parser.parse_args()
+
+    files = sorted(scandir(args.root))
+    polyglot = get_polyglot()
+    version = _file_cache_version(MARGIN, "head")
+    expected, plain = elapsed(detect_all, files, polyglot)
+    report = {"files": len(files), "plain_ms": round(plain * 1000, 1)}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "files.sqlite")
+        for run in ("cold", "warm"):
+            with FileCache(db, version) as blobs:
+                result, seconds = elapsed(detect_cached, files, polyglot, blobs)
+            if result != expected:
+                print("results differ", file=sys.stderr)
+                sys.exit(1)
+            report[run] = dict(blobs.stats(), ms=round(seconds * 1000, 1))
+    report["speedup"] = {run: round(plain * 1000 / report[run]["ms"], 2) for run in ("cold", "warm")}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+catboost commit classifier vs naive bayes one
+
+    python -m benchmarks.gitlog_backends --repo . --db analyzer/classifier-gitlog.json
+
+classifies commits of `git log` of repo with both backends: load time,
+latency of one predict call per batch size and share of commits on which
+the backends agree. Needs catboost and pandas; bayes part is skipped when
+--db doesn't exist
+"""
+from argparse import ArgumentParser
+from collections import Counter
+import json
+import os
+import time
+from analyzer.boosting import CatBoostCommitClassifier
+from analyzer.gitlog import CommitMessageClassifier, extract_commits
+from analyzer.utils import exec, chunks
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_SIZES = (1, 64, 256, 4096)
+
+
+def latency(classify, commits, size: int):
+    """
+    :return: mean ms per batch and commits per second
+    """
+    batches = list(chunks(commits, size))[:max(1, 2 ** 12 // size)]
+    start = time.perf_counter()
+    for batch in batches:
+        classify(batch)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    return {
+        "ms_per_batch": round(elapsed * 1000 / len(batches), 3),
+        "commits_per_sec": round(sum(len(batch) for batch in batches) / elapsed, 1),
+    }
+
+
+def main():
+    parser = ArgumentParser(description="benchmark commit classifier backends")
+    parser.add_argument("--repo", default=".", help="repository with history")
+    parser.add_argument("--db", default=os.path.join(ROOT, "analyzer", "classifier-gitlog.json"),
+                        help="naive bayes classifier")
+    parser.add_argument("--model", default=os.path.join(ROOT, "analyzer", "cat_model"), help="catboost model")
+    args = parser.parse_args()
+
+    stdout, _ = exec("git log --numstat --pretty=raw", cwd=args.repo)
+    commits = list(extract_commits(stdout))
+    report = {"commits": len(commits)}
+
+    start = time.perf_counter()
+    catboost = CatBoostCommitClassifier.load(args.model)
+    report["catboost"] = {
+        "load_ms": round((time.perf_counter() - start) * 1000, 3),
+        "batches": {size: latency(catboost.classify_commits, commits, size) for size in BATCH_SIZES},
+    }
+    cat_labels = catboost.classify_commits(commits)
+    report["catboost"]["labels"] = Counter(cat_labels)
+
+    if os.path.exists(args.db):
+        start = time.perf_counter()
+        bayes = CommitMessageClassifier.load(args.db)
+        bayes.model
+        messages = [commit.message for commit in commits]
+        report["bayes"] = {
+            "load_ms": round((time.perf_counter() - start) * 1000, 3),
+            "batches": {
+                size: latency(bayes.classify_many, messages, size)
+                for size in BATCH_SIZES
+            },
+        }
+        bayes_labels = [label.lower() for label in bayes.classify_many(messages)]
+        report["bayes"]["labels"] = Counter(bayes_labels)
+        agree = sum(1 for a, b in zip(cat_labels, bayes_labels) if a == b)
+        report["agreement"] = round(agree / len(commits), 4) if commits else None
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+commit message tokenizer: GITLOG_PIPELINE vs compiled scanner
+
+    python -m benchmarks.gitlog_tokenizer --messages 1000000
+
+tokenizes a synthetic corpus of commit messages (lowercased first lines,
+as extract_message gives them) with extract_pipeline over GITLOG_PIPELINE,
+with GITLOG_SCANNER alone and with extract_message_tokens (keyword
+prefilter, then findall or the scanner), checks all produce the same
+tokens and reports throughput of each
+"""
+from argparse import ArgumentParser
+import json
+import random
+import sys
+import time
+from analyzer.gitlog import GITLOG_PIPELINE, GITLOG_SCANNER, REGEX_MARKER_KEYWORD, extract_message_tokens
+from analyzer.utils import extract_pipeline, chunks
+
+
+WORDS = (
+    "update", "parser", "handle", "empty", "input", "config", "remove", "unused", "imports", "cache",
+    "rename", "variable", "support", "windows", "paths", "improve", "logging", "refactor", "client",
+    "api", "endpoint", "bump", "dependencies", "typo", "cleanup", "move", "helpers", "utils", "add",
+    "option", "fix", "crash", "when", "file", "is", "missing", "use", "context", "manager", "speed",
+)
+
+TEMPLATES = (
+    "{w} {w} {w}",
+    "{w} {w} in {w}",
+    "{w} {w} {w} {w} {w}",
+    "merge branch '{w}-{w}' into master",
+    "merge pull request #{n} from {w}/{w}",
+    "wip",
+    "bump version to {v}",
+    "release {v}",
+    "update readme.md",
+    "{w} docs for {w}",
+    "add tests for {w} ({w})",
+    "fix e2e {w} [{w}]",
+    "{w}: {w} {w}, {w}!",
+    "revert \"{w} {w}\"",
+)
+
+
+def corpus(size: int, seed: int = 0):
+    rnd = random.Random(seed)
+
+    def fill(template: str) -> str:
+        while "{" in template:
+            key = template[template.index("{") + 1]
+            value = {
+                "w": lambda: rnd.choice(WORDS),
+                "n": lambda: str(rnd.randint(1, 5000)),
+                "v": lambda: ".".join(str(rnd.randint(0, 20)) for _ in range(3)),
+            }[key]()
+            template = template.replace("{" + key + "}", value, 1)
+        return template
+
+    return [fill(rnd.choice(TEMPLATES)) for _ in range(size)]
+
+
+def pipeline(s: str):
+    return extract_pipeline(GITLOG_PIPELINE, s, pos=0)
+
+
+TOKENIZERS = {
+    "pipeline": pipeline,
+    "scanner": GITLOG_SCANNER.scan,
+    "prefiltered": extract_message_tokens,
+}
+
+
+def main():
+    parser = ArgumentParser(description="benchmark commit message tokenizers")
+    parser.add_argument("--messages", type=int, default=10 ** 6, help="corpus size")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+    args = parser.parse_args()
+
+    messages = corpus(args.messages, args.seed)
+    elapsed = {name: 0.0 for name in TOKENIZERS}
+    tokens = 0
+    for batch in chunks(messages, 2 ** 14):
+        results = {}
+        for name, tokenize in TOKENIZERS.items():
+            start = time.perf_counter()
+            results[name] = [list(tokenize(s)) for s in batch]
+            elapsed[name] += time.perf_counter() - start
+        if results["pipeline"] != results["scanner"] or results["pipeline"] != results["prefiltered"]:
+            print("token streams differ", file=sys.stderr)
+            sys.exit(1)
+        tokens += sum(len(t) for t in results["pipeline"])
+
+    report = {
+        "messages": len(messages),
+        "tokens": tokens,
+        "fast_path": round(sum(1 for s in messages if REGEX_MARKER_KEYWORD.search(s) is None) / len(messages), 4),
+    }
+    for name, seconds in elapsed.items():
+        report[name] = {
+            "ms": round(seconds * 1000, 1),
+            "messages_per_sec": round(len(messages) / seconds, 1),
+            "tokens_per_sec": round(tokens / seconds, 1),
+        }
+    report["speedup"] = {
+        name: round(elapsed["pipeline"] / elapsed[name], 2) for name in ("scanner", "prefiltered")
+    }
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Go imports: go list per file vs one go list per module vs import scanner
+
+    python -m benchmarks.go_imports --root /usr/local/go/src --sample 50
+
+reads every .go file go list knows under root (GOROOT sources by default)
+and collects its imports with deps.scan_go_imports, with one batched
+`go list -json ./...` (deps.go_list_imports) and, for --sample files, with
+`go list --json <file>` as get_go_deps ran it before. go list reports
+imports of packages, so scanned imports of files are merged per package
+to compare, also without the vendor/ prefix go list resolves. Needs Go
+toolchain
+"""
+from argparse import ArgumentParser
+from collections import defaultdict
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from analyzer.deps import go_list_imports, scan_go_imports
+from analyzer.utils import exec
+
+
+def go_list_file(file: str):
+    data, _ = exec('go list --json {}'.format(os.path.basename(file)), cwd=os.path.dirname(file))
+    return set(json.loads(data).get('Imports', []))
+
+
+def main():
+    parser = ArgumentParser(description="benchmark Go import scanner")
+    parser.add_argument("--root", default=None, help="dir of Go module, GOROOT/src by default")
+    parser.add_argument("--sample", type=int, default=50, help="files to run go list on one by one")
+    parser.add_argument("--seed", type=int, default=0, help="sample seed")
+    args = parser.parse_args()
+    if shutil.which("go") is None:
+        print("go is not installed", file=sys.stderr)
+        sys.exit(1)
+    root = args.root or os.path.join(exec("go env GOROOT")[0].strip(), "src")
+
+    start = time.perf_counter()
+    listed = go_list_imports(root)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanned = {}
+    for file in listed:
+        with open(file, "rb") as f:
+            scanned[file] = scan_go_imports(f.read().decode("utf-8", "replace"))
+    scanner = time.perf_counter() - start
+
+    packages = defaultdict(set)
+    for file, imports in scanned.items():
+        # package imports nothing
+        if not listed[file]:
+            continue
+        # files of one package and kind share go list imports
+        packages[(os.path.dirname(file), frozenset(listed[file]))] |= imports
+    agree = sum(1 for (_, expected), imports in packages.items() if imports == expected)
+    # go list resolves imports to vendored packages
+    unvendored = sum(1 for (_, expected), imports in packages.items()
+                     if imports == {i[len("vendor/"):] if i.startswith("vendor/") else i for i in expected})
+
+    sample = random.Random(args.seed).sample(sorted(listed), min(args.sample, len(listed)))
+    start = time.perf_counter()
+    for file in sample:
+        go_list_file(file)
+    per_file = (time.perf_counter() - start) / max(len(sample), 1) * len(listed)
+
+    print(json.dumps({
+        "files": len(listed),
+        "packages": len(packages),
+        "go_list_per_file_ms": round(per_file * 1000, 1),
+        "go_list_batched_ms": round(batched * 1000, 1),
+        "scanner_ms": round(scanner * 1000, 1),
+        "speedup": {
+            "per_file": round(per_file / scanner, 2),
+            "batched": round(batched / scanner, 2),
+        },
+        "agreement": round(agree / len(packages), 4) if packages else None,
+        "agreement_unvendored": round(unvendored / len(packages), 4) if packages else None,
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
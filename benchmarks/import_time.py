@@ -0,0 +1,93 @@
+"""
+import-time budget for `kd` entry point commands
+
+    python -m benchmarks.import_time
+
+runs every command with `python -X importtime`, sums self import time of
+all modules not imported by the bare interpreter and fails if a command
+exceeds its budget
+"""
+from argparse import ArgumentParser
+import subprocess
+import tempfile
+import sys
+import os
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# milliseconds
+BUDGETS = {
+    "--help": 100,
+    "init": 250,
+}
+
+ENTRY_POINT = "import sys; sys.argv = ['kd'] + sys.argv[1:]; from analyzer.main import main; main()"
+
+
+def import_time(args, cwd: str):
+    """
+    :param args: command line arguments of kd
+    :param cwd: working directory
+    :return: total import time (ms) and list of (ms, module) sorted by self time
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", ENTRY_POINT] + args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+    )
+    modules = []
+    baseline = _imported(["-c", "pass"], cwd, env)
+    for line in proc.stderr.decode().splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            ms, module = int(fields[0]) / 1000, fields[2].strip()
+        except ValueError:
+            continue  # header
+        if module not in baseline:
+            modules.append((ms, module))
+    if proc.returncode:
+        raise RuntimeError("kd {} failed: {}".format(" ".join(args), proc.stderr.decode()[-500:]))
+    return sum(ms for ms, _ in modules), sorted(modules, reverse=True)
+
+
+def _imported(cmd, cwd: str, env: dict):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+    )
+    return {
+        line.split("|")[-1].strip()
+        for line in proc.stderr.decode().splitlines()
+        if line.startswith("import time:")
+    }
+
+
+def main():
+    parser = ArgumentParser(description="import-time budget of kd")
+    parser.add_argument("--top", type=int, default=5, help="show the slowest modules")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as repo:
+        subprocess.run(["git", "init", "-q", repo])
+        for cmd, budget in BUDGETS.items():
+            total, modules = import_time([cmd], cwd=repo)
+            ok = total <= budget
+            failed = failed or not ok
+            print("kd {:<8} {:7.1f} ms (budget {} ms) {}".format(cmd, total, budget, "ok" if ok else "FAIL"))
+            for ms, module in modules[:args.top]:
+                print("    {:7.1f} ms  {}".format(ms, module))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+JS imports: esprima.parseModule vs import statement scanner
+
+    python -m benchmarks.js_imports --root analyzer/polyglot-samples/js
+
+collects imported packages of every .js/.mjs/.cjs/.jsx/.ts/.tsx file under
+root with esprima (which get_js_deps called before, needs `pip install
+esprima`) and with deps.scan_js_imports: time of each, share of files on
+which they agree and files esprima can't parse. The esprima reference
+visits every node, so require() and import() inside functions count too;
+get_js_deps used to look at top-level import declarations only
+"""
+from argparse import ArgumentParser
+import json
+import os
+import sys
+import time
+from analyzer.deps import scan_js_imports
+
+
+EXTENSIONS = (".js", ".mjs", ".cjs", ".jsx", ".ts", ".tsx")
+
+
+def read_sources(root: str):
+    sources = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not filename.endswith(EXTENSIONS):
+                continue
+            with open(os.path.join(dirpath, filename), "rb") as f:
+                sources.append(f.read().decode("utf-8", "replace"))
+    return sources
+
+
+def esprima_imports(s: str):
+    import esprima
+    imports, top_level = set(), set()
+
+    def add(r: set, node):
+        if node is not None and node.type == "Literal" and isinstance(node.value, str) \
+                and not node.value.startswith("."):
+            r.add(node.value.split("/")[0])
+
+    def visit(node, _):
+        if node.type in ("ImportDeclaration", "ExportAllDeclaration", "ExportNamedDeclaration"):
+            add(imports, node.source)
+        elif node.type == "CallExpression" and node.arguments and (
+                node.callee.type == "Import" or node.callee.type == "Identifier" and node.callee.name == "require"):
+            add(imports, node.arguments[0])
+
+    try:
+        script = esprima.parseModule(s, {"jsx": True}, visit)
+    except Exception:
+        return None, None
+    for node in script.body:
+        if node.type == "ImportDeclaration":
+            add(top_level, node.source)
+    return imports, top_level
+
+
+def timed(f, sources, repeat: int):
+    best, results = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [f(s) for s in sources]
+        best = min(best, time.perf_counter() - start)
+    return results, best
+
+
+def main():
+    parser = ArgumentParser(description="benchmark JS import scanner")
+    parser.add_argument("--root", default="analyzer/polyglot-samples/js", help="dir with JS/TS files")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--scale", type=int, default=1, help="concatenate each file N times")
+    args = parser.parse_args()
+    try:
+        import esprima  # noqa: F401
+    except ImportError:
+        print("esprima is not installed", file=sys.stderr)
+        sys.exit(1)
+
+    sources = ["\n".join([s] * args.scale) for s in read_sources(args.root)]
+    parsed, esprima_time = timed(esprima_imports, sources, args.repeat)
+    scanned, scan_time = timed(scan_js_imports, sources, args.repeat)
+    both = [(a, b) for (a, _), b in zip(parsed, scanned) if a is not None]
+    size = sum(len(s) for s in sources)
+    print(json.dumps({
+        "files": len(sources),
+        "kb": round(size / 1024, 1),
+        "esprima_ms": round(esprima_time * 1000, 1),
+        "scanner_ms": round(scan_time * 1000, 1),
+        "speedup": round(esprima_time / scan_time, 2),
+        "agreement": round(sum(1 for a, b in both if a == b) / len(both), 4) if both else None,
+        "esprima_errors": sum(1 for a, _ in parsed if a is None),
+        "esprima_errors_scanned": sum(1 for (a, _), b in zip(parsed, scanned) if a is None and b),
+        "top_level_only": sum(len(a) for _, a in parsed if a is not None),
+        "scanned": sum(len(b) for b in scanned),
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+local python deps: .py candidates per dependency vs module index
+
+    python -m benchmarks.local_deps --root /usr/lib/python3.11
+
+scans imports of every .py file under root (python standard library by
+default) and splits them into local and external as analyze_module did
+before (sibling and root `<dep>.py` probed in files of the module) and
+with deps.ModuleIndex (built once, a set lookup per dependency). Reports
+time of each, of index build apart, and deps each finds local
+"""
+from argparse import ArgumentParser
+import json
+import os
+import sysconfig
+import time
+from analyzer.deps import ModuleIndex, scan_python_imports, AstParseVisitor
+
+
+def read_deps(root: str):
+    deps = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                s = f.read().decode("utf-8", "replace")
+            imports = scan_python_imports(s)
+            if imports is None:
+                try:
+                    imports = AstParseVisitor.get_imports(s)
+                except (SyntaxError, ValueError):
+                    imports = set()
+            deps[path] = imports
+    return deps
+
+
+def probe(root: str, deps):
+    """
+    local check of analyze_module before the index
+    """
+    local = set()
+    for name, imports in deps.items():
+        for d in imports:
+            sibling = os.path.join(os.path.dirname(name), d) + '.py'
+            glob = os.path.join(root, d) + '.py'
+            if deps.get(sibling) is not None or deps.get(glob) is not None:
+                local.add((name, d))
+    return local
+
+
+def indexed(index: ModuleIndex, deps):
+    return {(name, d) for name, imports in deps.items() for d in imports if index.is_local("python", d, name)}
+
+
+def elapsed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description="benchmark local python deps")
+    parser.add_argument("--root", default=sysconfig.get_paths()["stdlib"], help="dir with python files")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    deps = read_deps(root)
+    probed, probe_time = elapsed(probe, root, deps)
+    index, build_time = elapsed(ModuleIndex.build, root)
+    local, lookup_time = elapsed(indexed, index, deps)
+    print(json.dumps({
+        "files": len(deps),
+        "deps": sum(len(imports) for imports in deps.values()),
+        "probe_ms": round(probe_time * 1000, 1),
+        "index_build_ms": round(build_time * 1000, 1),
+        "index_lookup_ms": round(lookup_time * 1000, 1),
+        "speedup": {
+            "lookup": round(probe_time / lookup_time, 2),
+            "total": round(probe_time / (build_time + lookup_time), 2),
+        },
+        "local": {
+            "probe": len(probed),
+            "index": len(local),
+            "probe_only": len(probed - local),
+        },
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
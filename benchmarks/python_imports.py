@@ -0,0 +1,72 @@
+"""
+python imports: ast.parse vs import statement scanner
+
+    python -m benchmarks.python_imports --root /usr/lib/python3.11
+
+collects top-level imported names of every .py file under root (python
+standard library by default) with AstParseVisitor and with
+deps.scan_python_imports: time of each, share of files on which they
+agree, scanner fallbacks to AST and files only the scanner can read
+"""
+from argparse import ArgumentParser
+import json
+import os
+import sysconfig
+import time
+from analyzer.deps import AstParseVisitor, scan_python_imports
+
+
+def read_sources(root: str):
+    sources = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            with open(os.path.join(dirpath, filename), "rb") as f:
+                sources.append(f.read().decode("utf-8", "replace"))
+    return sources
+
+
+def ast_imports(s: str):
+    try:
+        return AstParseVisitor.get_imports(s)
+    except (SyntaxError, ValueError):
+        return None
+
+
+def timed(f, sources, repeat: int):
+    best, results = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [f(s) for s in sources]
+        best = min(best, time.perf_counter() - start)
+    return results, best
+
+
+def main():
+    parser = ArgumentParser(description="benchmark python import scanner")
+    parser.add_argument("--root", default=sysconfig.get_paths()["stdlib"], help="dir with python files")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+
+    sources = read_sources(args.root)
+    parsed, ast_time = timed(ast_imports, sources, args.repeat)
+    scanned, scan_time = timed(scan_python_imports, sources, args.repeat)
+    both = [(a, b) for a, b in zip(parsed, scanned) if a is not None]
+    agree = sum(1 for a, b in both if a == b)
+    size = sum(len(s) for s in sources)
+    print(json.dumps({
+        "files": len(sources),
+        "kb": round(size / 1024, 1),
+        "ast_ms": round(ast_time * 1000, 1),
+        "scanner_ms": round(scan_time * 1000, 1),
+        "speedup": round(ast_time / scan_time, 2),
+        "agreement": round(agree / len(both), 4) if both else None,
+        "fallback": sum(1 for b in scanned if b is None),
+        "ast_errors": sum(1 for a in parsed if a is None),
+        "ast_errors_scanned": sum(1 for a, b in zip(parsed, scanned) if a is None and b is not None),
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Polyglot tokenizer: step pipeline vs single pass scanner
+
+    python -m benchmarks.tokenizer --samples analyzer/polyglot-samples
+
+tokenizes every sample with utils.extract_pipeline over BASE_PIPELINE,
+with BASE_SCANNER and with the bytes scanner over undecoded files, checks
+all produce the same tokens and reports throughput of each and peak
+python memory of reading and tokenizing the largest sample.
+
+With --db, also compares counting features of undecoded files through
+decoded tokens and vocabulary lookups with the scanner emitting model
+rows directly (Polyglot.ids): tokens per second and str and bytes objects
+created per file, counted the same way for both (see allocations)
+"""
+from argparse import ArgumentParser
+from collections import Counter
+import json
+import mmap
+import os
+import sys
+import time
+import tracemalloc
+from analyzer.polyglot import Polyglot, BASE_PIPELINE, BASE_SCANNER, extract_bytes
+from analyzer.utils import extract_pipeline
+
+
+def pipeline(s: str):
+    return extract_pipeline(BASE_PIPELINE, s)
+
+
+TOKENIZERS = {
+    "pipeline": pipeline,
+    "scanner": BASE_SCANNER.scan,
+    "bytes": Polyglot.extract,
+}
+
+
+def throughput(tokenize, docs, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = sum(1 for doc in docs for _ in tokenize(doc))
+        best = min(best, time.perf_counter() - start)
+    size = sum(len(doc) for doc in docs)
+    return {
+        "ms": round(best * 1000, 1),
+        "tokens_per_sec": round(tokens / best, 1),
+        "kb_per_sec": round(size / 1024 / best, 1),
+    }
+
+
+def read_text(fp: str):
+    with open(fp, "r") as f:
+        return sum(1 for _ in Polyglot.extract(f.read()))
+
+
+def read_mmap(fp: str):
+    with open(fp, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return sum(1 for _ in Polyglot.extract(buf))
+
+
+def peak_memory(read, fp: str) -> float:
+    """
+    :return: peak of python allocations, KB
+    """
+    tracemalloc.start()
+    read(fp)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+# methods creating a str or bytes object per call
+ALLOCATING = {"group", "decode", "encode", "format"}
+
+
+def allocations(features, data) -> Counter:
+    """
+    str and bytes objects created while features of data are counted:
+    returns of ALLOCATING methods called from python code, by type of
+    their result. Objects live for a token only, so tracemalloc
+    snapshots don't see them
+    """
+    created = Counter()
+
+    def profile(frame, event, arg):
+        if event != "c_return" or arg.__name__ not in ALLOCATING:
+            return
+        owner = getattr(arg, "__self__", None)
+        if arg.__name__ == "group":
+            created["str" if isinstance(owner.string, str) else "bytes"] += 1
+        else:
+            created["bytes" if arg.__name__ == "encode" else "str"] += 1
+
+    sys.setprofile(profile)
+    try:
+        for _ in features(data):
+            pass
+    finally:
+        sys.setprofile(None)
+    return created
+
+
+def count_rows(features, docs, repeat: int):
+    best, tokens = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = sum(sum(Counter(features(doc)).values()) for doc in docs)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "ms": round(best * 1000, 1),
+        "tokens_per_sec": round(tokens / best, 1),
+    }
+
+
+def counting(db: str, raw, repeat: int):
+    model = Polyglot.load(db).model
+    vocab, lookup = model.vocab, model.lookup("utf-8")
+    modes = {
+        "tokens": lambda data: map(vocab.get, Polyglot.extract(data)),
+        "ids": lambda data: extract_bytes(data, lookup),
+    }
+    for data in raw:
+        if Counter(modes["tokens"](data)) != Counter(modes["ids"](data)):
+            print("feature counts differ", file=sys.stderr)
+            sys.exit(1)
+    report = {name: count_rows(features, raw, repeat) for name, features in modes.items()}
+    tokens = sum(1 for data in raw for _ in Polyglot.extract(data))
+    for name, features in modes.items():
+        created = sum((allocations(features, data) for data in raw), Counter())
+        report[name]["allocations_per_file"] = {
+            kind: round(created[kind] / len(raw), 1) for kind in ("str", "bytes")
+        }
+        report[name]["allocations_per_token"] = round(sum(created.values()) / max(tokens, 1), 4)
+    report["speedup"] = round(report["tokens"]["ms"] / report["ids"]["ms"], 2)
+    return report
+
+
+def main():
+    parser = ArgumentParser(description="benchmark Polyglot tokenizers")
+    parser.add_argument("--samples", default="analyzer/polyglot-samples", help="samples dir")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--db", default="analyzer/polyglot-classifier.kdm", help="token classifier")
+    args = parser.parse_args()
+
+    files = [fp for fp, _ in sorted(Polyglot.sample_files(args.samples))]
+    docs, raw = [], []
+    for fp in files:
+        with open(fp, "rb") as f:
+            raw.append(f.read())
+        docs.append(raw[-1].decode().strip())
+
+    for doc, data in zip(docs, raw):
+        tokens = list(pipeline(doc))
+        if tokens != list(BASE_SCANNER.scan(doc)) or tokens != list(Polyglot.extract(data)):
+            print("token streams differ", file=sys.stderr)
+            sys.exit(1)
+
+    inputs = {"pipeline": docs, "scanner": docs, "bytes": raw}
+    report = {name: throughput(tokenize, inputs[name], args.repeat) for name, tokenize in TOKENIZERS.items()}
+    report["speedup"] = round(report["pipeline"]["ms"] / report["scanner"]["ms"], 2)
+    largest = max(files, key=lambda fp: len(raw[files.index(fp)]))
+    report["peak_kb"] = {
+        "file": largest,
+        "text": peak_memory(read_text, largest),
+        "mmap": peak_memory(read_mmap, largest),
+    }
+    if os.path.exists(args.db):
+        report["counting"] = counting(args.db, raw, args.repeat)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
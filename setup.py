@@ -8,7 +8,6 @@ attrs = {
     "license": "",
     "zip_sage": True,
     "install_requires": [
-        "esprima==4.0.1",
         "marshmallow==3.2.1",
         "marshmallow-dataclass==6.0.0",
         "catboost==0.12.2",
@@ -0,0 +1,40 @@
+import importlib.util
+import os
+import unittest
+from types import SimpleNamespace
+from analyzer.boosting import CAT_LABELS, CatBoostCommitClassifier
+
+
+CAT_MODEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analyzer", "cat_model")
+
+
+class LabelsTest(unittest.TestCase):
+
+    def test_class_indices(self):
+        model = SimpleNamespace(classes_=["5", "0", "3"], feature_names_=["fix"])
+        self.assertEqual(CatBoostCommitClassifier(model).labels, ["version", "bug", "refactor"])
+
+    def test_class_names(self):
+        model = SimpleNamespace(classes_=["bug", "docs"], feature_names_=["fix"])
+        self.assertEqual(CatBoostCommitClassifier(model).labels, ["bug", "docs"])
+
+
+@unittest.skipIf(importlib.util.find_spec("catboost") is None, "catboost is not installed")
+class ShippedModelTest(unittest.TestCase):
+
+    def test_labels(self):
+        classifier = CatBoostCommitClassifier.load(CAT_MODEL)
+        self.assertEqual(classifier.labels, list(CAT_LABELS))
+        messages = [
+            "fix crash when path is empty",
+            "update readme",
+            "add support for windows",
+            "refactor and cleanup",
+            "add tests",
+            "bump version to 1.2",
+        ]
+        self.assertEqual(classifier.classify_many(messages), list(CAT_LABELS))
+
+
+if __name__ == "__main__":
+    unittest.main()
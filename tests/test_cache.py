@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from analyzer import main
+from analyzer.cache import FileCache, blob_sha
+from analyzer.classifier import MARGIN
+
+
+class FileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.dir, "files.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_hit_miss(self):
+        with FileCache(self.db, "1") as blobs:
+            self.assertEqual(blobs.get_many(["a"]), {})
+            blobs.put("a", ("python", ["os"]))
+            # pending rows are found before flush
+            self.assertEqual(blobs.get_many(["a"]), {"a": ("python", ["os"])})
+        with FileCache(self.db, "1") as blobs:
+            self.assertEqual(blobs.get_many(["a", "b", "a"]), {"a": ("python", ["os"])})
+            self.assertEqual((blobs.hits, blobs.misses), (1, 1))
+            self.assertEqual(blobs.hit_rate, 0.5)
+
+    def test_version_mismatch(self):
+        with FileCache(self.db, "1") as blobs:
+            blobs.put("a", ("python", []))
+        with FileCache(self.db, "2") as blobs:
+            self.assertEqual(blobs.get_many(["a"]), {})
+            blobs.put("a", ("js", []))
+        with FileCache(self.db, "1") as blobs:
+            self.assertEqual(blobs.get_many(["a"]), {"a": ("python", [])})
+
+    def test_eviction_order(self):
+        with FileCache(self.db, "1", maxsize=2) as blobs:
+            for key in ("a", "b", "c"):
+                blobs.put(key, (key, []))
+                blobs.flush()
+                # distinct times of use
+                time.sleep(0.01)
+            # "a" is used again, "b" is the least recently used
+            blobs.get_many(["a"])
+        self.assertEqual(blobs.evicted, 1)
+        with FileCache(self.db, "1", maxsize=2) as blobs:
+            self.assertEqual(set(blobs.get_many(["a", "b", "c"])), {"a", "c"})
+
+    def test_key(self):
+        path = os.path.join(self.dir, "a.py")
+        with open(path, "wb") as f:
+            f.write(b"import os\n")
+        # git hash-object a.py
+        self.assertEqual(blob_sha(path), "21b405d8c2dac873e9063b1dff87e46c3876aa58")
+        self.assertEqual(FileCache.key(path), "21b405d8c2dac873e9063b1dff87e46c3876aa58:a.py")
+        self.assertIsNone(FileCache.key(os.path.join(self.dir, "missing.py")))
+
+
+class CachedAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_unreadable_first_copy(self):
+        files = []
+        for name in ("a", "b", "c"):
+            os.makedirs(os.path.join(self.dir, name))
+            files.append(os.path.join(self.dir, name, "run.py"))
+            with open(files[-1], "w") as f:
+                f.write("import os\n")
+        detect_file = main.detect_file
+
+        def detect(file, *args):
+            if file == files[0]:
+                return main.File(file, "UNKNOWN", set()), 0, "unreadable"
+            return detect_file(file, *args)
+
+        with mock.patch.object(main, "detect_file", detect), FileCache(os.path.join(self.dir, "db"), "1") as blobs:
+            results = list(main._cached_analysis(files, blobs, main.get_polyglot(), MARGIN, "head"))
+        self.assertEqual([(fl.lang, stage) for fl, _, _, stage in results],
+                         [("UNKNOWN", "unreadable"), ("python", "extension"), ("python", "extension")])
+        self.assertEqual(results[1][0].deps, {"os"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from analyzer.classifier import (
+    MODEL_HEADER, MODEL_HEADER_V1, MODEL_HEADER_V2, MODEL_MAGIC, Classifier, Counts, Model, convert, source_digest,
+)
+from analyzer.main import _model_path
+from analyzer.polyglot import NGramPolyglot
+from analyzer.shared import SharedModel
+
+
+class WordClassifier(Classifier):
+
+    @staticmethod
+    def extract(s: str):
+        return s.split()
+
+
+SAMPLES = [
+    ("def import self", "python"),
+    ("def self return", "python"),
+    ("import self none", "python"),
+    ("function var return", "js"),
+    ("var const function", "js"),
+]
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.classifier = WordClassifier.train(SAMPLES)
+
+    def test_classify_many(self):
+        self.assertEqual(self.classifier.classify_many(["def self", "var function"]), ["python", "js"])
+
+    def test_scores_agree_with_stream(self):
+        model = self.classifier.model
+        documents = ["def self", "", "var function var", "unknown"]
+        scores = model.scores(model.vectorize(s.split() for s in documents))
+        for s, r in zip(documents, scores):
+            expected = list(model.priors)
+            for t in model.ids(s.split()):
+                if t is None:
+                    continue
+                for c in range(len(expected)):
+                    expected[c] += model.costs[t * len(expected) + c]
+            for a, b in zip(r, expected):
+                self.assertAlmostEqual(a, b, places=6)
+
+    def test_guess_class(self):
+        # tie between classes of equal priors is broken by the hint
+        classifier = WordClassifier.train([("a", "x"), ("b", "y")])
+        self.assertEqual(classifier.classify("c", "x"), "x")
+        self.assertEqual(classifier.classify("c", "y"), "y")
+        self.assertEqual(classifier.classify_many(["c", "c"], ["y", "x"]), ["y", "x"])
+        self.assertEqual(classifier.classify_stream("c", "y").label, "y")
+
+
+class CountsTest(unittest.TestCase):
+
+    def round_trip(self, counts: Counts, **kwargs) -> Counts:
+        return Counts.from_frequencies(*counts.frequencies(), **kwargs)
+
+    def test_round_trip(self):
+        counts = Counts().merge(WordClassifier.train(SAMPLES).counts)
+        counts.add(["def", "def", "lambda"], "python")
+        self.assertEqual(self.round_trip(counts), counts)
+
+    def test_round_trip_common_divisor(self):
+        # priors alone give 3 documents, occurrences need 6
+        counts = Counts({"a": 2, "b": 4}, {("a", "x"): 1, ("b", "y"): 2, ("b", "z"): 5})
+        self.assertEqual(self.round_trip(counts), counts)
+
+    def test_rounded_priors(self):
+        counts = Counts.from_frequencies({"a": 0.333, "b": 0.667}, {("a", "x"): 2.0})
+        self.assertEqual(counts.docs, {"a": 333, "b": 667})
+        self.assertEqual(counts.tokens, {("a", "x"): 666})
+
+    def test_max_docs(self):
+        classes = {"a": 0.123456789, "b": 0.876543211}
+        counts = Counts.from_frequencies(classes, {}, max_docs=1000)
+        self.assertLessEqual(sum(counts.docs.values()), 1000)
+        for label, p in counts.frequencies()[0].items():
+            self.assertAlmostEqual(p, classes[label], places=3)
+
+
+class BinaryModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = WordClassifier.train(SAMPLES).model
+
+    def assertModel(self, model):
+        self.assertEqual(model.labels, self.model.labels)
+        self.assertEqual(model.vocab, self.model.vocab)
+        self.assertEqual(list(model.priors), list(self.model.priors))
+        self.assertEqual(list(model.costs), list(self.model.costs))
+
+    def test_round_trip(self):
+        self.assertModel(Model.frombuffer(self.model.tobytes()))
+
+    def test_older_versions(self):
+        data = self.model.tobytes()
+        _, _, width, rows, size, labels_size, _ = MODEL_HEADER.unpack_from(data)
+        body = data[MODEL_HEADER.size:]
+        v2 = MODEL_HEADER_V2.pack(MODEL_MAGIC, 2, width, rows, size, labels_size) + body
+        self.assertModel(Model.frombuffer(v2))
+        # rows of token model are its tokens
+        v1 = MODEL_HEADER_V1.pack(MODEL_MAGIC, 1, width, size, labels_size) + body
+        self.assertModel(Model.frombuffer(v1))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Model.frombuffer(b"JSON" + self.model.tobytes()[4:])
+        newer = bytearray(self.model.tobytes())
+        newer[4] += 1
+        with self.assertRaises(ValueError):
+            Model.frombuffer(bytes(newer))
+
+
+class ModelPathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.json = os.path.join(self.dir, "model.json")
+        self.binary = os.path.join(self.dir, "model.kdm")
+        with open(self.json, "w") as f:
+            f.write(WordClassifier.train(SAMPLES).dumps())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_converted(self):
+        self.assertEqual(_model_path("model.json", self.dir), self.json)
+        convert(self.json, self.binary)
+        self.assertIsNotNone(source_digest(self.binary))
+        self.assertEqual(_model_path("model.json", self.dir), self.binary)
+        os.remove(self.json)
+        self.assertEqual(_model_path("model.json", self.dir), self.binary)
+
+    def test_retrained(self):
+        convert(self.json, self.binary)
+        # same mtime, other content
+        with open(self.json, "w") as f:
+            f.write(WordClassifier.train(SAMPLES[:3] + [("x y", "go")]).dumps())
+        stat = os.stat(self.binary)
+        os.utime(self.json, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(_model_path("model.json", self.dir), self.json)
+
+    def test_newer_json(self):
+        convert(self.json, self.binary)
+        past = time.time() - 60
+        os.utime(self.binary, (past, past))
+        self.assertEqual(_model_path("model.json", self.dir), self.json)
+
+    def test_unknown_source(self):
+        with open(self.binary, "wb") as f:
+            f.write(WordClassifier.train(SAMPLES).dumpb())
+        self.assertIsNone(source_digest(self.binary))
+        self.assertEqual(_model_path("model.json", self.dir), self.json)
+
+
+class ConvertTest(unittest.TestCase):
+
+    def test_ngram(self):
+        classifier = NGramPolyglot.train([("def import self", "python"), ("var const function", "js")])
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = os.path.join(tmp, "ngram.json"), os.path.join(tmp, "ngram.kdm")
+            with open(src, "w") as f:
+                f.write(classifier.dumps())
+            convert(src, dst, NGramPolyglot)
+            converted = NGramPolyglot.load(dst)
+            self.assertEqual(list(converted.model.costs), list(classifier.model.costs))
+            self.assertEqual(converted.classify_many(["def self", "var const"]), ["python", "js"])
+            converted.model.close()
+
+
+class SharedModelTest(unittest.TestCase):
+
+    def test_attach_close(self):
+        classifier = WordClassifier.train(SAMPLES)
+        shared = SharedModel.create(classifier.model)
+        try:
+            attached = WordClassifier.from_model(shared.attach())
+            self.assertEqual(attached.classify_many(["def self", "var function"]), ["python", "js"])
+            # views of costs are released before the handle is closed
+            attached.model.close()
+            self.assertIsNone(attached.model.buffer)
+        finally:
+            shared.unlink()
+
+
+if __name__ == "__main__":
+    unittest.main()
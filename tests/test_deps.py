@@ -0,0 +1,224 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from analyzer.deps import (
+    AstParseVisitor, ModuleIndex, go_list_imports, scan_go_imports, scan_js_imports, scan_python_imports,
+)
+
+
+GO_FILE = '''// Package main comment with import "fake"
+/* block comment
+import "fake2" */
+package main // trailing
+
+// grouped
+import (
+	"fmt"
+	str "strings" // named
+	. "math"
+	_ "embed"
+	/* comment inside */ "os"
+	`net/http`
+)
+
+import "errors"
+import alias "path/filepath"
+
+func main() {
+	s := "import \\"notimport\\""
+	fmt.Println(s)
+}
+'''
+
+
+class ScanGoImportsTest(unittest.TestCase):
+
+    def test_imports(self):
+        self.assertEqual(scan_go_imports(GO_FILE), {
+            "fmt", "strings", "math", "embed", "os", "net/http", "errors", "path/filepath",
+        })
+
+    def test_no_package(self):
+        self.assertEqual(scan_go_imports('import "fmt"\n'), set())
+
+    def test_unterminated_group(self):
+        self.assertEqual(scan_go_imports('package a\nimport (\n\t"fmt"\n\t"os"\n'), {"fmt", "os"})
+
+    def test_escaped_path(self):
+        self.assertEqual(scan_go_imports('package a\nimport "\\x66mt"\n'), {"fmt"})
+
+
+class ScanPythonImportsTest(unittest.TestCase):
+
+    def assertImports(self, s, expected):
+        self.assertEqual(scan_python_imports(s), expected)
+        self.assertEqual(AstParseVisitor.get_imports(s), expected)
+
+    def test_strings_and_comments(self):
+        self.assertImports(
+            's = "import os"\n# import sys\n"""\nimport re\n"""\nt = \'from x import y\'\nimport json\n', {"json"})
+        self.assertImports('s = "a\\\\"; import os\nt = \'\\\'import re\'\n', {"os"})
+
+    def test_from_in_expressions(self):
+        self.assertImports("def f():\n    yield from g()\n    raise E from e\nimport os\n", {"os"})
+
+    def test_bracketed(self):
+        self.assertImports(
+            "from a.b import (\n    c,  # comment\n    d as e,\n)\nfrom . import x\nfrom ..pkg import y\n"
+            "from .z import (w)\n", {"a", "x", "pkg", "z"})
+
+    def test_continued(self):
+        self.assertImports("import a.b, \\\n    c as d\nimport e ; import f\nif x: import g\nelse:from\\\n h import i\n",
+                           {"a", "c", "e", "f", "g", "h"})
+
+    def test_not_understood(self):
+        for s in ("x = (import os)\n", "import os, \\\n", "from os import\n"):
+            self.assertIsNone(scan_python_imports(s), s)
+
+
+class ScanJsImportsTest(unittest.TestCase):
+
+    def test_strings_and_comments(self):
+        s = "const s = 'import x from \"a\"'; // require('b')\n/* import c from 'c' */ import d from 'd';"
+        self.assertEqual(scan_js_imports(s), {"d"})
+
+    def test_template(self):
+        s = "const t = `${require('tpl')} and ${ {a: require(\"nested\")}.a } require('no')`; `import x from 'y'`;"
+        self.assertEqual(scan_js_imports(s), {"tpl", "nested"})
+
+    def test_regex_and_division(self):
+        s = "const r = /import 'x'/g; const q = a / b; require('c') / 2; x = y / require('z') / 3;"
+        self.assertEqual(scan_js_imports(s), {"c", "z"})
+        self.assertEqual(scan_js_imports("return /'/.test(s) ? require('a') : 0"), {"a"})
+
+    def test_dynamic_import(self):
+        s = "const m = await import('dyn'); import('./rel'); import * as ns from '@scope/pkg/sub';"
+        self.assertEqual(scan_js_imports(s), {"dyn", "@scope"})
+
+    def test_export_from(self):
+        s = ("export * from 'all'; export * as n from 'nsp'; export { a, b as c } from 'named';"
+             " export type { T } from 'types'; export const x = 1;")
+        self.assertEqual(scan_js_imports(s), {"all", "nsp", "named", "types"})
+
+    def test_typescript(self):
+        s = "import type { A } from 'ta'; import { type B } from 'tb'; import def, { c } from 'mixed'; import 'side';"
+        self.assertEqual(scan_js_imports(s), {"ta", "tb", "mixed", "side"})
+
+    def test_skipped(self):
+        s = "import a from './a'; const b = require('../b'); foo.import('x'); obj.require('y'); $require('z');"
+        self.assertEqual(scan_js_imports(s), set())
+
+
+class ModuleIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make(self, *paths):
+        for path in paths:
+            path = os.path.join(self.dir, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def path(self, path):
+        return os.path.join(self.dir, path)
+
+    def test_celery(self):
+        # django project: manage.py next to the package of settings
+        self.make("proj/manage.py", "proj/proj/__init__.py", "proj/proj/celery.py", "proj/proj/settings.py",
+                  "proj/app/tasks.py", "requirements.txt")
+        index = ModuleIndex.build(self.dir)
+        self.assertTrue(index.is_local("python", "proj"))
+        for path in ("proj/app/tasks.py", "proj/manage.py", "run.py"):
+            self.assertFalse(index.is_local("python", "celery", self.path(path)))
+        # from .celery import app
+        self.assertTrue(index.is_local("python", "celery", self.path("proj/proj/__init__.py")))
+        # manage.py sees packages of its dir
+        self.assertTrue(index.is_local("python", "app", self.path("proj/manage.py")))
+        self.assertFalse(index.is_local("python", "app", self.path("proj/proj/settings.py")))
+
+    def test_project_roots(self):
+        self.make("src/lib/__init__.py", "tool/setup.py", "tool/cli.py", "tool/deep/helper.py", "run.py")
+        index = ModuleIndex.build(self.dir)
+        for name in ("lib", "tool", "cli", "deep", "run"):
+            self.assertTrue(index.is_local("python", name), name)
+        self.assertFalse(index.is_local("python", "helper"))
+
+    def test_namespace_package(self):
+        # no __init__.py at any level
+        self.make("ns/plugins/audio/player.py", "src/company/tools/lint.py")
+        index = ModuleIndex.build(self.dir)
+        self.assertTrue(index.is_local("python", "ns"))
+        self.assertTrue(index.is_local("python", "company"))
+        for name in ("plugins", "audio", "player", "tools", "lint"):
+            self.assertFalse(index.is_local("python", name), name)
+
+    def test_siblings(self):
+        self.make("scripts/run.py", "scripts/common.py", "tests/test_a.py", "tests/helpers.py",
+                  "pkg/__init__.py", "pkg/util.py", "pkg/core.py")
+        index = ModuleIndex.build(self.dir)
+        self.assertTrue(index.is_local("python", "common", self.path("scripts/run.py")))
+        self.assertTrue(index.is_local("python", "helpers", self.path("tests/test_a.py")))
+        self.assertFalse(index.is_local("python", "common", self.path("tests/test_a.py")))
+        self.assertFalse(index.is_local("python", "common"))
+        # from . import util
+        self.assertTrue(index.is_local("python", "util", self.path("pkg/core.py")))
+        self.assertFalse(index.is_local("python", "util", self.path("scripts/run.py")))
+
+    def test_installed_packages(self):
+        self.make(".venv/lib/python3.11/site-packages/requests/__init__.py",
+                  "env/pyvenv.cfg", "env/lib/python3.11/site-packages/six.py",
+                  "vendor/lib/site-packages/yaml/__init__.py", ".tox/py311/lib/attr/__init__.py",
+                  "web/node_modules/pkg/setup.py", "web/node_modules/pkg/flask.py",
+                  "app.py")
+        index = ModuleIndex.build(self.dir)
+        self.assertEqual(index.python, {"app"})
+        self.assertEqual(index.siblings, {})
+
+    def test_ignore_list(self):
+        self.make("docs/conf.py", "app.py")
+        index = ModuleIndex.build(self.dir, [re.compile("docs")])
+        self.assertEqual(index.python, {"app"})
+
+    def test_js_workspace(self):
+        self.make("packages/a/index.js")
+        for path, name in (("packages/a/package.json", "@scope/a"), ("package.json", "root")):
+            with open(self.path(path), "w") as f:
+                json.dump({"name": name}, f)
+        index = ModuleIndex.build(self.dir)
+        self.assertTrue(index.is_local("typescript", "@scope"))
+        self.assertTrue(index.is_local("js", "root"))
+        self.assertFalse(index.is_local("python", "root"))
+
+
+@unittest.skipIf(shutil.which("go") is None, "go is not installed")
+class GoListImportsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        files = {
+            "go.mod": "module example.com/a\n\ngo 1.18\n",
+            "a.go": 'package a\n\nimport "fmt"\n\nvar _ = fmt.Sprint\n',
+            # host can't be both
+            "b_windows.go": '//go:build windows && !windows\n\npackage a\n\nimport "os"\n\nvar _ = os.Args\n',
+        }
+        for name, s in files.items():
+            with open(os.path.join(self.dir, name), "w") as f:
+                f.write(s)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_ignored_files_left_out(self):
+        listed = go_list_imports(self.dir)
+        self.assertEqual(listed, {os.path.join(self.dir, "a.go"): {"fmt"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
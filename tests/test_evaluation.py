@@ -0,0 +1,40 @@
+import unittest
+from collections import Counter
+from analyzer.evaluation import holdout_split, kfold_split
+
+
+def files(**sizes):
+    return [("{}/{}".format(label, i), label) for label, n in sizes.items() for i in range(n)]
+
+
+class SplitTest(unittest.TestCase):
+
+    def test_holdout_fraction(self):
+        train, test = holdout_split(files(a=20, b=8), 0.25)
+        self.assertEqual(Counter(label for _, label in test), {"a": 5, "b": 2})
+        self.assertEqual(len(train) + len(test), 28)
+        self.assertFalse(set(train) & set(test))
+
+    def test_holdout_small_classes(self):
+        train, test = holdout_split(files(a=2, b=3, c=1), 0.1)
+        self.assertEqual(Counter(label for _, label in test), {"a": 1, "b": 1})
+        self.assertEqual(Counter(label for _, label in train), {"a": 1, "b": 2, "c": 1})
+
+    def test_holdout_keeps_training_files(self):
+        train, test = holdout_split(files(a=2), 0.9)
+        self.assertEqual((len(train), len(test)), (1, 1))
+
+    def test_holdout_deterministic(self):
+        samples = files(a=10)
+        self.assertEqual(holdout_split(samples, 0.2), holdout_split(list(reversed(samples)), 0.2))
+        self.assertEqual(holdout_split(samples, 0.2)[1], [("a/4", "a"), ("a/9", "a")])
+
+    def test_kfold(self):
+        folds = kfold_split(files(a=7, b=3), 3)
+        self.assertEqual(sorted(f for _, test in folds for f in test), sorted(files(a=7, b=3)))
+        for train, test in folds:
+            self.assertFalse(set(train) & set(test))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from analyzer.gitlog import (
+    GITLOG_PIPELINE, History, MemoizedClassifier, extract_commits, extract_message_tokens, normalize_message,
+)
+from analyzer.utils import LRUCache, extract_pipeline
+
+
+MESSAGES = (
+    "e2e", "add e2e tests", "1e2e", "e22e", "e2 e", "test1x", "test12", "testsuite2",
+    "v1.23", "v2", "release 10.0", "bump version to 2.0.10-rc2",
+    "[x]", "x\\y ^_` z", "fix #1234 in readme.md", "update docs: changelog",
+    "merge branch 'feature/x' into main", "  many   spaces\n\tand tabs ", "a2b", "",
+)
+
+
+class MessageTokensTest(unittest.TestCase):
+
+    def test_same_as_pipeline(self):
+        for s in MESSAGES:
+            self.assertEqual(list(extract_message_tokens(s)), list(extract_pipeline(GITLOG_PIPELINE, s)), s)
+
+    def test_markers(self):
+        self.assertEqual(list(extract_message_tokens("add e2e tests")), ["add", "#!TEST", "#!TEST"])
+        self.assertEqual(list(extract_message_tokens("fix #1234 in readme.md")), ["fix", "in", "#!DOCS"])
+        self.assertEqual(list(extract_message_tokens("[x]")), ["x]"])
+
+
+class NormalizeMessageTest(unittest.TestCase):
+
+    def test_tokens_unchanged(self):
+        for s in MESSAGES:
+            self.assertEqual(list(extract_message_tokens(normalize_message(s))), list(extract_message_tokens(s)), s)
+
+    def test_keys(self):
+        self.assertEqual(normalize_message("bump to v1.34  (#456)"), normalize_message("bump to v7.89 (#13)"))
+        # "2" of e2e and one digit after a test marker are kept apart
+        self.assertEqual(normalize_message("e2e test1x test12"), "e2e test0x test00")
+        self.assertNotEqual(normalize_message("e2e"), normalize_message("e3e"))
+
+
+class MemoizedClassifierTest(unittest.TestCase):
+
+    def test_dedupe_and_cache(self):
+        batches = []
+
+        def classify_many(messages):
+            batches.append(messages)
+            return ["#" + message for message in messages]
+
+        memo = MemoizedClassifier(classify_many, LRUCache())
+        self.assertEqual(memo.classify_many(["bump 1.3", "fix", "bump 3.4"]), ["#bump 1.3", "#fix", "#bump 1.3"])
+        self.assertEqual(memo.classify_many(["fix", "bump 5.6", "docs"]), ["#fix", "#bump 1.3", "#docs"])
+        self.assertEqual(batches, [["bump 1.3", "fix"], ["docs"]])
+        self.assertEqual((memo.messages, memo.classified), (6, 3))
+        self.assertEqual(memo.hit_rate, 0.5)
+
+
+# git log --numstat --pretty=raw
+LOG = """commit d925200f627e1cb2f543ba2d402a24e23e9c5287
+tree f8f5c2e377e9980e8cd483dd9f27c0174b1d0b96
+parent 510a82b064a7e696b51e4e7a1cef8b387f2f095d
+author ann <ann@x.org> 1577836800 +0000
+committer ann <ann@x.org> 1577836800 +0000
+
+    update readme.md for v1.2.3
+
+1\t0\tREADME.md
+-\t-\timg.bin
+
+commit 510a82b064a7e696b51e4e7a1cef8b387f2f095d
+tree 9eb1f8425a1896d60df191a3936ffa87bb2ebf6e
+parent 7f87e76d70b8cad060c04dc9a2bec44e6ed358da
+author Bob B <bob@x.org> 1577836800 +0000
+committer Bob B <bob@x.org> 1577836800 +0000
+
+    fix bug in a.py, see #12
+
+2\t1\ta.py
+-\t-\timg.bin
+0\t0\tdocs/empty.md
+
+commit 7f87e76d70b8cad060c04dc9a2bec44e6ed358da
+tree 29616a95bb9cdc02ca158e0ab5e596f2177c3ffd
+author Ann <ann@x.org> 1577836800 +0000
+committer Ann <ann@x.org> 1577836800 +0000
+
+    initial commit
+
+1\t0\tREADME.md
+2\t0\ta.py
+"""
+
+
+def per_row_updates(commits, labels, author, known):
+    # loop of analyze_module before History
+    per_file, per_author_class = {}, {}
+    for commit, label in zip(commits, labels):
+        name = author(commit.author.name)
+        for insert, delete, filename in commit.stats:
+            if not known(filename):
+                continue
+            per_file[filename] = per_file.get(filename, 0) + insert + delete
+            per_author_class[name, label] = per_author_class.get((name, label), 0) + insert + delete
+    return per_file, per_author_class
+
+
+class HistoryTest(unittest.TestCase):
+
+    def test_from_log(self):
+        commits = list(extract_commits(LOG))
+        history = History.from_log(LOG)
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history.commits, [commit.commit for commit in commits])
+        self.assertEqual(history.messages, ["update readme.md for v1.2.3", "fix bug in a.py, see #12", "initial commit"])
+        self.assertEqual([history.author_names[i] for i in history.authors], ["ann", "Bob B", "Ann"])
+        rows = [(history.commits[c], history.filenames[f], u)
+                for c, f, u in zip(history.stat_commits, history.stat_files, history.stat_updates)]
+        self.assertEqual(rows, [(commit.commit, filename, insert + delete)
+                                for commit in commits for insert, delete, filename in commit.stats])
+
+    def test_updates(self):
+        commits = list(extract_commits(LOG))
+        labels = ["docs", "bug", "feature"]
+        aliases = {"ann": "Ann"}
+        self.assertEqual(History.from_log(LOG).updates(labels, lambda name: aliases.get(name, name), bool), (
+            {"README.md": 2, "img.bin": 0, "a.py": 5, "docs/empty.md": 0},
+            {("Ann", "docs"): 1, ("Bob B", "bug"): 3, ("Ann", "feature"): 3},
+        ))
+        for known in (lambda filename: True, lambda filename: filename.endswith(".py"), lambda filename: False):
+            expected = per_row_updates(commits, labels, lambda name: aliases.get(name, name), known)
+            for history in (History.from_log(LOG), History.from_commits(commits)):
+                updates = history.updates(labels, lambda name: aliases.get(name, name), known)
+                self.assertEqual(updates, expected)
+                # keys in order of first numstat row
+                self.assertEqual([list(d) for d in updates], [list(d) for d in expected])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import mmap
+import tempfile
+import unittest
+from analyzer.polyglot import BASE_PIPELINE, BASE_SCANNER, BYTES_SCANNER, Polyglot, extract_bytes, extract_file
+from analyzer.utils import extract_pipeline
+
+
+def pieces(s, size):
+    return lambda offset: (s[i:i + size] for i in range(offset, len(s), size))
+
+
+class ScannerTest(unittest.TestCase):
+
+    def assertPipeline(self, s, tokens):
+        self.assertEqual(list(BASE_SCANNER.scan(s)), tokens)
+        self.assertEqual(list(extract_pipeline(BASE_PIPELINE, s)), tokens)
+
+    def test_sgml(self):
+        self.assertPipeline('<a href="x.html" class=\'big\'>link</a> <br/> <!DOCTYPE html>',
+                            ["<a>", "href=", "class=", "link", "</a>", "<br/>", "<!DOCTYPE>", "html"])
+
+    def test_shebang(self):
+        self.assertPipeline("#!/usr/bin/env python3\nimport os", ["SHEBANG#!python", "import", "os"])
+        self.assertPipeline("#!/bin/sh\necho $HOME", ["SHEBANG#!sh", "echo", "$", "HOME"])
+        # at the beginning of input only
+        self.assertPipeline("x\n#!/bin/sh", ["x"])
+
+    def test_code(self):
+        self.assertPipeline("x = 1 + 2 * y; if (a && b || !c) { f(x[0]) } // done",
+                            ["x", "=", "+", "*", "y", ";", "if", "(", "a", "&&", "b", "||", "!", "c", ")",
+                             "{", "f", "(", "x", "[", "]", ")", "}"])
+        self.assertPipeline("{- haskell -} main = 'a' ++ \"b\"", ["main", "=", "+", "+"])
+
+    def test_non_ascii(self):
+        self.assertPipeline("façade = 'naïve' // コメント\nπ := 3.14", ["façade", "=", "π", ":="])
+
+    def test_unterminated(self):
+        # delimiter without its end fails, the rules after it apply there
+        self.assertPipeline('a "b c\nd', ["a", "b", "c", "d"])
+        self.assertPipeline("a /* b ' c */ d ' e f", ["a", "d", "e", "f"])
+        self.assertPipeline('x = """doc\nstring', ["x", "=", "doc", "string"])
+        self.assertPipeline("f(`tpl ${x}` + `open", ["f", "(", "+", "open"])
+        self.assertPipeline("<!-- open <b>", ["<", "!", "-", "-", "open", "<b>"])
+        self.assertPipeline("# no newline", [])
+
+    def test_unterminated_many(self):
+        # failed searches are remembered, later openings still fail
+        for case in ("a /* b ", "a <!-- b ", "a {- b ", "a ` b "):
+            s = case * 2 ** 7
+            self.assertEqual(list(BASE_SCANNER.scan(s)), list(extract_pipeline(BASE_PIPELINE, s)), case)
+
+    def test_extract_strips(self):
+        self.assertEqual(list(Polyglot.extract("\n  #!/bin/sh\nls  \n")), ["SHEBANG#!sh", "ls"])
+
+
+class ExtractBytesTest(unittest.TestCase):
+
+    DOCUMENTS = (
+        '<a href="x.html" class=\'big\'>link</a>',
+        "\n  #!/usr/bin/env python3\nimport os  \n",
+        "façade = 'naïve' // コメント\nπ := 3.14",
+        'a "b c\nd /* e',
+        "",
+    )
+
+    def test_same_as_str(self):
+        for s in self.DOCUMENTS:
+            self.assertEqual(list(extract_bytes(s.encode())), list(Polyglot.extract(s)), s)
+
+    def test_mmap(self):
+        s = self.DOCUMENTS[2]
+        with tempfile.TemporaryFile() as f:
+            f.write(s.encode())
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                self.assertEqual(list(extract_bytes(m)), list(Polyglot.extract(s)))
+
+    def test_invalid_utf8(self):
+        # words stay whole, only emitted tokens are decoded with replacement
+        self.assertEqual(list(extract_bytes(b"caf\xe9 = 1; \xff\xfeok")), ["caf\ufffd", "=", ";", "\ufffd\ufffdok"])
+
+    def test_lookup(self):
+        lookup = {"π".encode(): 0, b":=": 1}
+        self.assertEqual(list(BYTES_SCANNER.scan("π := x".encode(), lookup=lookup)), [0, 1, None])
+
+
+class ExtractFileTest(unittest.TestCase):
+
+    def extract(self, data: bytes, **kwargs):
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            return list(extract_file(f, len(data), **kwargs))
+
+    def test_same_as_str(self):
+        for s in ExtractBytesTest.DOCUMENTS:
+            for size in (1, 5, 2 ** 14):
+                self.assertEqual(self.extract(s.encode(), chunk_size=size), list(Polyglot.extract(s)), (s, size))
+
+    def test_windows(self):
+        # shebang is matched at the beginning of file only, not of tail window
+        data = b"#!/bin/sh\n" + b"echo a\n" * 100 + b"#!/bin/sh\nls"
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            window = list(extract_file(f, 24, "head+tail", chunk_size=4))
+        self.assertEqual(window, ["SHEBANG#!sh", "ec", "ls"])
+
+    def test_long_string(self):
+        # end of string is far beyond the piece it starts in
+        data = b'var a = "' + b"x y " * 2 ** 15 + b'";\nvar b = 1;'
+        self.assertEqual(self.extract(data, chunk_size=2 ** 10), ["var", "a", "=", ";", "var", "b", "=", ";"])
+
+    def test_unterminated(self):
+        # input is read again from the delimiter, other rules apply there
+        for data in (b'a "b c\nd', b"a /* b ' c */ d ' e f", b"x\n/* a 'b' " + b"c " * 2 ** 12):
+            self.assertEqual(self.extract(data, chunk_size=7), list(extract_bytes(data)), data[:20])
+
+    def test_chunk_smaller_than_token(self):
+        data = "#!/usr/bin/env python3\nπ = read_file('a')  # fällt\n<a href='b'>c</a>".encode()
+        expected = list(extract_bytes(data))
+        for size in (1, 2, 3):
+            self.assertEqual(self.extract(data, chunk_size=size), expected, size)
+
+    def test_stream_guard(self):
+        data = b"/* a */ long_identifier 'b' c"
+        expected = list(BYTES_SCANNER.scan(data))
+        for size in (1, 4):
+            self.assertEqual(list(BYTES_SCANNER.stream(pieces(data, size), guard=16)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from analyzer.main import PREFIX_READ_SIZE, detect_file, get_polyglot
+from analyzer.resolution import UNRESOLVED, load_resolution
+
+
+class ByContentTest(unittest.TestCase):
+
+    def test_modeline_of_tail(self):
+        resolution = load_resolution()
+        head = "x = 1\n" * 10
+        self.assertEqual(resolution.by_content(head + "# vim: ft=go\n").label, "golang")
+        # last lines are of the tail, not of the head
+        self.assertIsNone(resolution.by_content(head, "x = 1\n" * 10).label)
+        self.assertEqual(resolution.by_content(head, b"x = 1\n# vim: ft=go\n").label, "golang")
+
+
+class PolyglotResolveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.polyglot = get_polyglot()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, s):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(s)
+        return path
+
+    def test_model_classes(self):
+        # dialects are classes of their family, other languages are kept as is
+        self.assertEqual(self.polyglot.resolve("a.ts").label, "js")
+        self.assertEqual(self.polyglot.resolve("a.less").label, "css")
+        self.assertNotIn("makefile", self.polyglot.classes)
+        self.assertEqual(self.polyglot.resolve("Makefile").label, "makefile")
+        self.assertEqual(self.polyglot.resolve("script"), UNRESOLVED)
+        self.assertEqual(self.polyglot.classify_many(["a b", "c d"], [".ts", ".scss"]), ["js", "css"])
+
+    def test_modeline_after_prefix(self):
+        path = self.write("script", "x = 1\n" * PREFIX_READ_SIZE + "# vim: set ft=go:\n")
+        fl, _, stage = detect_file(path, self.polyglot)
+        self.assertEqual((fl.lang, stage), ("golang", "modeline"))
+
+    def test_text_files_not_tokenized(self):
+        for name, s in (("Makefile", "all:\n\tgo build ./...\n"), ("README.md", "# a {b: c}\n"),
+                        ("data.json", '{"a": 1}\n'), ("MANIFEST.in", "include *.json\n")):
+            fl, tokens, stage = detect_file(self.write(name, s), self.polyglot)
+            self.assertNotEqual(stage, "tokenized", name)
+            self.assertEqual(tokens, 0, name)
+            self.assertNotIn(fl.lang, self.polyglot.classes, name)
+
+
+if __name__ == "__main__":
+    unittest.main()